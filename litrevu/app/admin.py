@@ -1,7 +1,132 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
-from django.apps import apps
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Max
+from django.utils.functional import cached_property
+from .models import User, Ticket, Review, UserFollows, TimelineEntry
+from .backends import forget_users
+from . import search
 
-for model in apps.get_app_config('app').get_models():
-    admin.site.register(model)
+# filtered changelists count this many rows at most, the rows past it are only listed by a narrower filter
+COUNT_LIMIT = 10000
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator that never counts a whole table.
+
+    An unfiltered changelist takes the highest id as its size, an index lookup that overestimates by
+    the number of deleted rows. A filtered one counts its first COUNT_LIMIT rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(estimate=Max('pk'))['estimate'] or 0
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = ApproximateCountPaginator
+    # the "n total" link next to the filtered count runs a COUNT(*) of the table
+    show_full_result_count = False
+    # the receivers keeping the counters, rollups and timelines only handle rows being created or deleted,
+    # a row pointed at other users or tickets is deleted and created again instead
+    fixed_fields = ()
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        return (*readonly_fields, *self.fixed_fields) if obj else readonly_fields
+
+    def get_actions(self, request):
+        # delete_selected loads every selected object and its relations for the confirmation page
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+
+class SoftDeleteAdmin(LargeTableAdmin):
+    content_type = None
+    # no date_hierarchy: no index leads with time_created, its date aggregates would read the whole table
+    list_filter = ('is_deleted',)
+    actions = ('soft_delete_selected',)
+
+    def get_queryset(self, request):
+        # moderators see the soft-deleted rows as well, until purge_deleted removes them
+        return self.model.all_objects.all()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(search_term, self.content_type)), False
+
+    @admin.action(description="Delete the selected rows", permissions=['delete'])
+    def soft_delete_selected(self, request, queryset):
+        deleted = queryset.soft_delete()
+        self.message_user(request, f"{deleted} {self.model._meta.verbose_name_plural} deleted, "
+                                   f"purge_deleted removes them from the database")
+
+
+@admin.register(User)
+class LitrevuUserAdmin(LargeTableAdmin, UserAdmin):
+    list_display = ('username', 'email', 'followers_count', 'following_count', 'is_active', 'is_staff')
+    # prefix matches only, an icontains search over every column reads the whole table
+    search_fields = ('^username', '=email')
+    actions = ('deactivate_selected',)
+
+    @admin.action(description="Deactivate the selected users", permissions=['change'])
+    def deactivate_selected(self, request, queryset):
+        user_ids = list(queryset.filter(is_active=True).values_list('pk', flat=True))
+        User.objects.filter(pk__in=user_ids).update(is_active=False)
+        # the authentication backend caches users, the deactivated ones must be logged out now
+        forget_users(user_ids)
+        self.message_user(request, f"{len(user_ids)} users deactivated")
+
+
+@admin.register(Ticket)
+class TicketAdmin(SoftDeleteAdmin):
+    content_type = 'TICKET'
+    list_display = ('title', 'user', 'review_count', 'time_created', 'is_deleted')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    # the search box queries the full-text index of the titles and descriptions
+    search_fields = ('title',)
+    readonly_fields = ('review_count', 'rating_sum')
+
+
+@admin.register(Review)
+class ReviewAdmin(SoftDeleteAdmin):
+    content_type = 'REVIEW'
+    list_display = ('headline', 'rating', 'user', 'ticket', 'time_created', 'is_deleted')
+    list_select_related = ('user', 'ticket')
+    autocomplete_fields = ('user',)
+    raw_id_fields = ('ticket',)
+    search_fields = ('headline',)
+    fixed_fields = ('user', 'ticket')
+
+
+@admin.register(UserFollows)
+class UserFollowsAdmin(LargeTableAdmin):
+    list_display = ('user', 'followed_user')
+    list_select_related = ('user', 'followed_user')
+    autocomplete_fields = ('user', 'followed_user')
+    search_fields = ('^user__username', '^followed_user__username')
+    fixed_fields = ('user', 'followed_user')
+    actions = ('delete_follows',)
+
+    @admin.action(description="Delete the selected follows", permissions=['delete'])
+    def delete_follows(self, request, queryset):
+        # delete_selected would render a confirmation page listing every follow first
+        with transaction.atomic():
+            # the post_delete receivers prune the timelines and update the counters
+            deleted = queryset.delete()[0]
+        self.message_user(request, f"{deleted} follows deleted")
+
+
+@admin.register(TimelineEntry)
+class TimelineEntryAdmin(LargeTableAdmin):
+    list_display = ('user', 'ticket', 'review', 'time_created')
+    list_select_related = ('user', 'ticket', 'review')
+    raw_id_fields = ('user', 'ticket', 'review')
@@ -0,0 +1,87 @@
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .feeds import FEED_PAGE_SIZE
+
+MAX_PAGE_SIZE = 200
+
+
+def page_size(request):
+    limit = request.GET.get('limit', '')
+    return min(int(limit), MAX_PAGE_SIZE) if limit.isdigit() and int(limit) > 0 else FEED_PAGE_SIZE
+
+
+def validators(scope, user):
+    """
+    Return the (last modified, etag) validators of the feed or the posts of a user, read from the user row
+    already loaded for the request. app.timeline.touch moves them whenever a post, an edit, a deletion,
+    a counter, an author's name or a follow changes what the feed shows, the posts of a user are part of it.
+    """
+    return user.feed_updated, f'{scope}-{user.pk}-{user.feed_version}'
+
+
+def feed_etag(request, *args, **kwargs):
+    return validators('feed', request.user)[1]
+
+
+def feed_last_modified(request, *args, **kwargs):
+    return validators('feed', request.user)[0]
+
+
+def posts_etag(request, *args, **kwargs):
+    return validators('posts', request.user)[1]
+
+
+def posts_last_modified(request, *args, **kwargs):
+    return validators('posts', request.user)[0]
+
+
+def serialize_ticket(ticket):
+    return {
+        'type': ticket.content_type,
+        'id': ticket.pk,
+        'user': ticket.user.username,
+        'title': ticket.title,
+        'description': ticket.description,
+        'image': ticket.image.url if ticket.image else None,
+        'time_created': ticket.time_created.isoformat(),
+        'review_count': ticket.review_count,
+        'rating_average': ticket.rating_average,
+    }
+
+
+def serialize_review(review):
+    return {
+        'type': review.content_type,
+        'id': review.pk,
+        'user': review.user.username,
+        'headline': review.headline,
+        'body': review.body,
+        'rating': review.rating,
+        'time_created': review.time_created.isoformat(),
+        'ticket': serialize_ticket(review.ticket),
+    }
+
+
+def stream_page(items, next_cursor):
+    """Yield the JSON document of a page one item at a time, the document is never held in memory at once."""
+    yield '{"items": ['
+    for index, item in enumerate(items):
+        serialize = serialize_review if item.content_type == 'REVIEW' else serialize_ticket
+        yield (',' if index else '') + json.dumps(serialize(item))
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
+
+async def iterate_async(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def page_response(request, items, next_cursor):
+    """Stream the JSON document of a page, the items are loaded already and serializing them runs no query."""
+    chunks = stream_page(items, next_cursor)
+    if isinstance(request, ASGIRequest):
+        # the ASGI handler reads a sync iterator to the end before sending anything
+        chunks = iterate_async(chunks)
+    return StreamingHttpResponse(chunks, content_type='application/json')
@@ -0,0 +1,58 @@
+from itertools import islice
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache, caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from .middleware import cache_stats
+from .models import User
+
+USER_CACHE_TIMEOUT = 60 * 60
+
+
+def user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def forget_users(user_ids):
+    """Drop the cached users, called whenever a user row changes."""
+    keys = [user_key(user_id) for user_id in user_ids]
+
+    def forget():
+        iterator = iter(keys)
+        while batch := list(islice(iterator, 1000)):
+            cache.delete_many(batch)
+
+    forget()
+    # again after the commit, a request may have cached the row as it was before the change
+    transaction.on_commit(forget)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend loading the user of a session from the cache.
+
+    The user row is cached after the first request, later requests don't query it until the
+    user is saved (password or profile change, login) or one of its counters changes.
+
+    forget_users only reaches the cache it runs against, the cache must be shared by every process
+    (memcached, redis): with a per-process locmem cache a deactivated user or an old password would stay
+    logged in on the other workers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+            raise ImproperlyConfigured("CachedModelBackend needs a cache shared by every process, not LocMemCache")
+
+    def get_user(self, user_id):
+        user = cache.get(user_key(user_id))
+        cache_stats.record('user', hit=user is not None)
+        if user is None:
+            try:
+                user = User._default_manager.get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            cache.set(user_key(user_id), user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,20 @@
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import ObjectDoesNotExist
+
+# names of the {% cache %} fragments holding the rendered cards in feeds.html and posts.html,
+# they are keyed by content_type, pk and card_version so an edited item, or a renamed author, gets new keys
+CARD_FRAGMENTS = ('feed_card', 'post_card')
+
+
+def card_keys(item):
+    vary_on = [item.content_type, item.pk, item.card_version]
+    return [make_template_fragment_key(fragment, vary_on) for fragment in CARD_FRAGMENTS]
+
+
+def evict_cards(item):
+    try:
+        cache.delete_many(card_keys(item))
+    except ObjectDoesNotExist:
+        # the ticket or the author went first, nothing can render this card any more
+        pass
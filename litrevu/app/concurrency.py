@@ -0,0 +1,22 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+def run_query(query):
+    try:
+        return query()
+    finally:
+        # worker threads don't see the request_finished signal that usually closes their connection
+        close_old_connections()
+
+
+async def run_concurrently(*queries):
+    """
+    Run each callable in its own worker thread, each one with its own database connection, and
+    return their results in order.
+
+    Only for independent read queries: the callables don't share the transaction of the request.
+    """
+    return await asyncio.gather(*(sync_to_async(run_query, thread_sensitive=False)(query) for query in queries))
@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Ticket, Review, User, UserFollows
+from .backends import forget_users
+
+REPAIR_BATCH_SIZE = 1000
+
+
+def review_added(review):
+    Ticket.objects.filter(pk=review.ticket_id)\
+        .update(review_count=F('review_count') + 1, rating_sum=F('rating_sum') + int(review.rating))
+
+
+def review_removed(review, rating=None):
+    # the rating last saved, the instance may have been edited since
+    rating = review.rating if rating is None else rating
+    Ticket.objects.filter(pk=review.ticket_id)\
+        .update(review_count=F('review_count') - 1, rating_sum=F('rating_sum') - int(rating))
+
+
+def reviews_removed(review_ids):
+    """Take a set of reviews out of the counters of their tickets, with one update per ticket."""
+    totals = Review.all_objects.filter(pk__in=review_ids).order_by().values('ticket')\
+        .annotate(count=Count('id'), ratings=Sum('rating'))
+    for total in totals:
+        Ticket.objects.filter(pk=total['ticket'])\
+            .update(review_count=F('review_count') - total['count'], rating_sum=F('rating_sum') - total['ratings'])
+
+
+def rating_changed(review, previous_rating):
+    Ticket.objects.filter(pk=review.ticket_id)\
+        .update(rating_sum=F('rating_sum') + int(review.rating) - int(previous_rating))
+
+
+def follow_added(follow):
+    User.objects.filter(pk=follow.user_id).update(following_count=F('following_count') + 1)
+    User.objects.filter(pk=follow.followed_user_id).update(followers_count=F('followers_count') + 1)
+    forget_users([follow.user_id, follow.followed_user_id])
+
+
+def follow_removed(follow):
+    User.objects.filter(pk=follow.user_id).update(following_count=F('following_count') - 1)
+    User.objects.filter(pk=follow.followed_user_id).update(followers_count=F('followers_count') - 1)
+    forget_users([follow.user_id, follow.followed_user_id])
+
+
+def subquery_total(queryset, group_by, aggregate):
+    """Correlated subquery computing aggregate over the rows of queryset sharing the outer primary key."""
+    return Coalesce(
+        Subquery(queryset.filter(**{group_by: OuterRef('pk')}).order_by().values(group_by)
+                 .annotate(total=aggregate).values('total')),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def repair_tickets(batch_size=REPAIR_BATCH_SIZE, queryset=None):
+    queryset = Ticket.objects.all() if queryset is None else queryset
+    return repair(queryset, batch_size,
+                  review_count=subquery_total(Review.objects.all(), 'ticket', Count('id')),
+                  rating_sum=subquery_total(Review.objects.all(), 'ticket', Sum('rating')))
+
+
+def repair_users(batch_size=REPAIR_BATCH_SIZE, queryset=None):
+    queryset = User.objects.all() if queryset is None else queryset
+    updated = repair(queryset, batch_size,
+                     followers_count=subquery_total(UserFollows.objects.all(), 'followed_user', Count('id')),
+                     following_count=subquery_total(UserFollows.objects.all(), 'user', Count('id')))
+    forget_users(queryset.values_list('pk', flat=True).iterator())
+    return updated
+
+
+def repair(queryset, batch_size, **counters):
+    """Recompute counters with one UPDATE per range of batch_size primary keys, keeping write transactions short."""
+    updated = 0
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return updated
+        with transaction.atomic():
+            updated += queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(**counters)
+        last_pk = pks[-1]
@@ -0,0 +1,46 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+# set by ReadReplicaMiddleware while a view flagged with read_only_database runs and renders
+read_only = ContextVar('read_only', default=False)
+
+
+def replica_available():
+    # in tests the replica mirrors the default database, reading through it would miss uncommitted rows
+    return REPLICA in settings.DATABASES and \
+        connections[REPLICA].settings_dict['NAME'] != connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+
+
+class ReadReplicaRouter:
+    """Sends the reads of read-only views to the replica alias, every write goes to the default database."""
+
+    def db_for_read(self, model, **hints):
+        if read_only.get() and replica_available():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases open the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+def apply_pragmas(connection):
+    """Apply SQLITE_PRAGMAS to a newly opened sqlite connection."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if 'mode=ro' in str(connection.settings_dict['NAME']):
+        # the journal mode is stored in the database file, only a writer can change it
+        pragmas.pop('journal_mode', None)
+    for name, value in pragmas.items():
+        # on the raw connection, these statements aren't counted as queries of the request
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,110 @@
+from django.db.models import Value, CharField, Q
+from django.utils.dateparse import parse_datetime
+from .models import Ticket, Review, TimelineEntry
+
+FEED_PAGE_SIZE = 20
+
+
+def parse_cursor(value):
+    """
+    Return the (time_created, id, content_type) encoded in a `before` cursor, or None if it is missing or
+    malformed. content_type is only part of the cursors of merged pages, it is None otherwise.
+    """
+    if not value:
+        return None
+    parts = value.split(',')
+    if len(parts) < 2:
+        return None
+    timestamp, pk, *content_type = parts
+    try:
+        time_created = parse_datetime(timestamp)
+    except ValueError:
+        # well formed but out of range, e.g. a 13th month
+        return None
+    if time_created is None or not pk.isdigit() or content_type not in ([], ['REVIEW'], ['TICKET']):
+        return None
+    return time_created, int(pk), content_type[0] if content_type else None
+
+
+def format_cursor(time_created, pk, content_type=None):
+    cursor = f'{time_created.isoformat()},{pk}'
+    return f'{cursor},{content_type}' if content_type else cursor
+
+
+def before_cursor(queryset, cursor, content_type=None):
+    """
+    Keyset condition on (time_created, id), matches the descending feed ordering. The rows of a merged page
+    are ordered on (time_created, id, content_type): a ticket and a review can share both values, the one
+    of the table passed as content_type comes after the cursor when its type sorts lower.
+    """
+    if cursor is None:
+        return queryset
+    time_created, pk, cursor_type = cursor
+    condition = Q(time_created__lt=time_created) | Q(time_created=time_created, id__lt=pk)
+    if content_type and cursor_type and content_type < cursor_type:
+        condition |= Q(time_created=time_created, id=pk)
+    return queryset.filter(condition)
+
+
+def split_page(rows, page_size, key):
+    """Cut the page_size + 1 fetched rows down to one page and build the cursor of the next one."""
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, format_cursor(*key(rows[-1]))
+
+
+def keyset_page(queryset, cursor=None, page_size=FEED_PAGE_SIZE):
+    rows = list(before_cursor(queryset, cursor).order_by('-time_created', '-id')[:page_size + 1])
+    return split_page(rows, page_size, key=lambda row: (row.time_created, row.id))
+
+
+def merged_page(reviews, tickets, cursor=None, page_size=FEED_PAGE_SIZE):
+    """
+    Return one page of reviews and tickets merged on time_created, newest first.
+
+    The union, ordering and limit run in the database, only the keys of the page are fetched
+    before loading the matching rows, so the cost of a page doesn't grow with the history.
+    """
+    keys, next_cursor = merged_keys(reviews, tickets, cursor, page_size)
+    return load_items(keys), next_cursor
+
+
+def merged_keys(reviews, tickets, cursor=None, page_size=FEED_PAGE_SIZE):
+    review_keys = before_cursor(reviews, cursor, 'REVIEW')\
+        .annotate(content_type=Value('REVIEW', CharField()))\
+        .values_list('id', 'time_created', 'content_type')
+    ticket_keys = before_cursor(tickets, cursor, 'TICKET')\
+        .annotate(content_type=Value('TICKET', CharField()))\
+        .values_list('id', 'time_created', 'content_type')
+    keys = list(review_keys.union(ticket_keys, all=True)
+                .order_by('-time_created', '-id', '-content_type')[:page_size + 1])
+    return split_page(keys, page_size, key=lambda row: (row[1], row[0], row[2]))
+
+
+def load_reviews(keys):
+    review_ids = [pk for pk, _, content_type in keys if content_type == 'REVIEW']
+    return Review.objects.select_related('user', 'ticket__user').in_bulk(review_ids) if review_ids else {}
+
+
+def load_tickets(keys):
+    ticket_ids = [pk for pk, _, content_type in keys if content_type == 'TICKET']
+    return Ticket.objects.select_related('user').in_bulk(ticket_ids) if ticket_ids else {}
+
+
+def ordered_items(keys, reviews, tickets):
+    items = {'REVIEW': reviews, 'TICKET': tickets}
+    return [items[content_type][pk] for pk, _, content_type in keys if pk in items[content_type]]
+
+
+def load_items(keys):
+    """Load the reviews and tickets for a list of (id, time_created, content_type) keys, keeping their order."""
+    return ordered_items(keys, load_reviews(keys), load_tickets(keys))
+
+
+def timeline_page(user, cursor=None, page_size=FEED_PAGE_SIZE):
+    """Return one page of the precomputed feed of a user, newest first."""
+    entries = TimelineEntry.objects.filter(user=user)\
+        .select_related('ticket__user', 'review__user', 'review__ticket__user')
+    entries, next_cursor = keyset_page(entries, cursor, page_size)
+    return [entry.review if entry.review_id else entry.ticket for entry in entries], next_cursor
@@ -0,0 +1,41 @@
+from django.db import router, transaction
+from django.db.models.deletion import Collector
+from .models import User, UserFollows
+from . import counters, timeline
+
+
+def follow_many(user, user_ids):
+    """
+    Follow every active user of user_ids in one transaction, returns the ids that were not followed yet.
+
+    bulk_create sends no signal, what the UserFollows receivers do for one row is done here once for the batch.
+    """
+    # read before the transaction: sqlite can't upgrade a transaction that has read to a write while another
+    # connection writes, a follow made in between is skipped by ignore_conflicts
+    new_ids = set(
+        User.objects.filter(pk__in=set(user_ids) - {user.pk}, is_active=True)
+        .exclude(followed_by__user=user).values_list('pk', flat=True)
+    )
+    if not new_ids:
+        return new_ids
+    with transaction.atomic():
+        UserFollows.objects.bulk_create(
+            [UserFollows(user_id=user.pk, followed_user_id=followed_id) for followed_id in new_ids],
+            ignore_conflicts=True,
+        )
+        timeline.backfill(user.pk, new_ids)
+        counters.repair_users(queryset=User.objects.filter(pk__in=[user.pk, *new_ids]))
+    return new_ids
+
+
+def unfollow_many(user, user_ids):
+    """Unfollow every user of user_ids in one transaction, returns the ids that were followed."""
+    db = router.db_for_write(UserFollows)
+    follows = UserFollows.objects.using(db).filter(user=user, followed_user_id__in=set(user_ids))
+    # what QuerySet.delete() does, keeping the collected rows: they are read before its transaction starts,
+    # which then writes first and never has to upgrade a read lock
+    collector = Collector(using=db, origin=follows)
+    collector.collect(follows)
+    # the post_delete receivers prune the timeline and update the counters
+    collector.delete()
+    return {follow.followed_user_id for follow in collector.data.get(UserFollows, ())}
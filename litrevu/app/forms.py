@@ -1,4 +1,5 @@
 from django import forms
+from django.db.models import Exists, OuterRef
 from django.core.validators import MinValueValidator, MaxValueValidator
 from .models import Ticket, Review, User, UserFollows
 
@@ -41,18 +42,27 @@ class TicketAndReviewForm(forms.ModelForm):
 
 
 class FollowUserForm(forms.Form):
-    follow_username = forms.CharField(max_length=150, required=True)
+    follow_username = forms.CharField(
+        max_length=150, required=True,
+        widget=forms.TextInput(attrs={'list': 'username-suggestions', 'autocomplete': 'off'}),
+    )
 
     def __init__(self, *args, **kwargs):
         self.user = kwargs.pop('user')
+        self.followed_user = None
         super().__init__(*args, **kwargs)
 
     def clean_follow_username(self):
         username = self.cleaned_data['follow_username']
-        if not User.objects.filter(username=username).exists():
-            raise forms.ValidationError(f'user {username} does not exist')
-        if UserFollows.objects.filter(user=self.user, followed_user__username=username).exists():
-            raise forms.ValidationError('user already followed')
         if self.user.username == username:
             raise forms.ValidationError("u can't follow yourself")
+        # a single query tells whether the user exists and is already followed
+        followed_user = User.objects.filter(username=username).annotate(
+            already_followed=Exists(UserFollows.objects.filter(user=self.user, followed_user=OuterRef('pk')))
+        ).first()
+        if followed_user is None:
+            raise forms.ValidationError(f'user {username} does not exist')
+        if followed_user.already_followed:
+            raise forms.ValidationError('user already followed')
+        self.followed_user = followed_user
         return username
@@ -0,0 +1,49 @@
+import posixpath
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+
+# widths of the renditions generated for each ticket image, the cards are never wider than 960px
+RENDITION_WIDTHS = (320, 640, 960)
+RENDITION_FORMAT = 'WEBP'
+RENDITION_QUALITY = 80
+
+# renditions are derived from the content addressed originals, they keep predictable names in MEDIA_ROOT
+rendition_storage = FileSystemStorage()
+
+
+def rendition_name(name, width):
+    stem, _ = posixpath.splitext(name)
+    return f'renditions/{stem}-{width}w.webp'
+
+
+def has_renditions(name):
+    # renditions are written smallest first, the largest one only exists once they all do
+    return rendition_storage.exists(rendition_name(name, RENDITION_WIDTHS[-1]))
+
+
+def generate_renditions(name):
+    """Write a resized WebP copy of the stored image name at every width of RENDITION_WIDTHS."""
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    for width in RENDITION_WIDTHS:
+        rendition = image.copy()
+        # thumbnail never upscales, a small original is only re-encoded
+        rendition.thumbnail((width, image.height))
+        buffer = BytesIO()
+        rendition.save(buffer, format=RENDITION_FORMAT, quality=RENDITION_QUALITY)
+        path = rendition_name(name, width)
+        rendition_storage.delete(path)
+        rendition_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(name):
+    for width in RENDITION_WIDTHS:
+        rendition_storage.delete(rendition_name(name, width))
+
+
+def srcset(name):
+    return ', '.join(f'{rendition_storage.url(rendition_name(name, width))} {width}w' for width in RENDITION_WIDTHS)
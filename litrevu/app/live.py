@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.template.loader import render_to_string
+from . import timeline
+from .feeds import format_cursor
+
+MAX_SUBSCRIBERS = 1000
+QUEUE_SIZE = 100
+# ends the stream when the subscriber is too slow, the client reloads its feed instead
+RESET = {'event': 'reset'}
+
+
+class HubFull(Exception):
+    pass
+
+
+class Subscription:
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # runs on the loop of the subscriber, the queue isn't thread safe
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+    async def get(self, timeout):
+        """Return the next event, or None when nothing was published during timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class FeedHub:
+    """
+    In-process publish/subscribe of the new feed items, keyed by the id of the user who should see them.
+
+    Publishers are the save signals, running in any thread, subscribers are the live feed streams running
+    on an event loop. Only the streams served by the same process receive the items it publishes.
+    """
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS, queue_size=QUEUE_SIZE):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+        self.count = 0
+
+    def subscribe(self, user_id):
+        with self.lock:
+            if self.count >= self.max_subscribers:
+                raise HubFull(f'{self.count} subscribers already connected')
+            subscription = Subscription(user_id, self.queue_size)
+            self.subscriptions[user_id].add(subscription)
+            self.count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.user_id, set())
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+                self.count -= 1
+                if not subscriptions:
+                    del self.subscriptions[subscription.user_id]
+
+    def has_subscribers(self, user_ids):
+        with self.lock:
+            return any(user_id in self.subscriptions for user_id in user_ids)
+
+    def publish(self, user_ids, event):
+        with self.lock:
+            targets = [subscription for user_id in user_ids for subscription in self.subscriptions.get(user_id, ())]
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # the loop of the subscriber is closed, its stream unsubscribes when it is collected
+                pass
+
+
+feed_hub = FeedHub()
+
+
+def publish_item(item):
+    """Push a new ticket or review to the connected users whose timeline it was added to."""
+    if item.content_type == 'REVIEW':
+        recipients = timeline.review_recipients(item)
+    else:
+        recipients = timeline.ticket_recipients(item)
+    # the card is only rendered when someone is listening
+    if not feed_hub.has_subscribers(recipients):
+        return
+    feed_hub.publish(recipients, {
+        'event': 'item',
+        'id': format_cursor(item.time_created, item.pk),
+        'html': render_to_string('feed-card.html', {'feed': item}),
+    })
@@ -0,0 +1,90 @@
+import asyncio
+import sys
+from io import BytesIO
+
+# headers that WSGI passes without the HTTP_ prefix
+WSGI_PLAIN_HEADERS = {'CONTENT_TYPE', 'CONTENT_LENGTH'}
+
+
+def wsgi_request(application, method, url, headers=(), body=b'', host='localhost'):
+    """Send one request to a WSGI application in the current thread, returns (status, headers, content)."""
+    path, _, query = url.partition('?')
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': host,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers:
+        name = name.upper().replace('-', '_')
+        environ[name if name in WSGI_PLAIN_HEADERS else f'HTTP_{name}'] = value
+
+    started = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = response_headers
+
+    result = application(environ, start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        # closing the response sends request_finished, which closes the database connection
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], content
+
+
+async def asgi_request(application, method, url, headers=(), body=b'', host='localhost'):
+    """Send one request to an ASGI application on the running event loop, returns (status, headers, content)."""
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', host.encode()), (b'content-length', str(len(body)).encode())]
+        + [(name.lower().encode(), value.encode()) for name, value in headers],
+        'client': ('127.0.0.1', 0),
+        'server': (host, 80),
+    }
+    request_messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    disconnected = asyncio.Event()
+
+    async def receive():
+        if request_messages:
+            return request_messages.pop()
+        # the client stays connected until the response is sent
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    response = {'status': None, 'headers': [], 'body': []}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = [(name.decode(), value.decode()) for name, value in message.get('headers', [])]
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    await application(scope, receive, send)
+    disconnected.set()
+    return response['status'], response['headers'], b''.join(response['body'])
@@ -0,0 +1,55 @@
+import csv
+import json
+import sys
+from contextlib import contextmanager
+
+# columns of each kind of record, users are referenced by username and tickets by id
+FIELDS = {
+    'tickets': ('id', 'user', 'title', 'description', 'image', 'time_created'),
+    'reviews': ('id', 'ticket', 'user', 'rating', 'headline', 'body', 'time_created'),
+    'follows': ('user', 'followed_user'),
+}
+FORMATS = ('jsonl', 'csv')
+
+
+def guess_format(path, format=None):
+    if format:
+        return format
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+@contextmanager
+def open_file(path, mode):
+    """Open path as utf-8 text, or stdin/stdout for -."""
+    if path == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+        return
+    with open(path, mode, encoding='utf-8', newline='') as file:
+        yield file
+
+
+def read_records(file, format):
+    """Yield one dict per record, empty values are left out."""
+    if format == 'csv':
+        rows = csv.DictReader(file)
+    else:
+        rows = (json.loads(line) for line in file if line.strip())
+    for row in rows:
+        yield {name: value for name, value in row.items() if value not in ('', None)}
+
+
+class RecordWriter:
+    def __init__(self, file, format, fields):
+        self.file = file
+        self.fields = fields
+        self.csv = None
+        if format == 'csv':
+            self.csv = csv.DictWriter(file, fieldnames=fields)
+            self.csv.writeheader()
+
+    def write(self, values):
+        record = dict(zip(self.fields, values))
+        if self.csv:
+            self.csv.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + '\n')
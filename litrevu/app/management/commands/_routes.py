@@ -0,0 +1,49 @@
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.urls import URLPattern, get_resolver, reverse
+from app.models import User, Ticket, Review, UserFollows
+
+# routes that change state on GET, that regular users can't open or that never end
+SKIPPED_ROUTES = {'logout', 'performance-stats', 'user-follow-bulk', 'feed-live'}
+
+# primary keys to fill the url arguments of each route, picked among the objects of the user
+ROUTE_ARGUMENTS = {
+    'ticket-update': lambda user: {'pk': Ticket.objects.filter(user=user).values_list('pk', flat=True).first()},
+    'ticket-delete': lambda user: {'pk': Ticket.objects.filter(user=user).values_list('pk', flat=True).first()},
+    'review-update': lambda user: {'pk': Review.objects.filter(user=user).values_list('pk', flat=True).first()},
+    'review-delete': lambda user: {'pk': Review.objects.filter(user=user).values_list('pk', flat=True).first()},
+    'create-review': lambda user: {'ticket_id': Ticket.objects.values_list('pk', flat=True).first()},
+    'user-unfollow': lambda user: {'pk': UserFollows.objects.filter(user=user).values_list('pk', flat=True).first()},
+}
+
+
+def route_urls(user, names=None):
+    """Yield a (url name, path) pair for each named route of the root urlconf that can be requested by user."""
+    seen = set()
+    for pattern in get_resolver().url_patterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        name = pattern.name
+        if name in seen or name in SKIPPED_ROUTES or (names and name not in names):
+            continue
+        seen.add(name)
+        if pattern.pattern.converters and name not in ROUTE_ARGUMENTS:
+            continue
+        kwargs = ROUTE_ARGUMENTS[name](user) if name in ROUTE_ARGUMENTS else {}
+        if None in kwargs.values():
+            # the user has nothing this route could be requested with
+            continue
+        yield name, reverse(name, kwargs=kwargs)
+
+
+def benchmark_user(username=None):
+    """Return the user named username, or by default the user following the most people."""
+    if username:
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"user {username} does not exist")
+    user = User.objects.annotate(follow_count=Count('following')).order_by('-follow_count').first()
+    if user is None:
+        raise CommandError("the database has no user, run seed_data first")
+    return user
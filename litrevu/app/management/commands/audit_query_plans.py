@@ -0,0 +1,84 @@
+import re
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from ._routes import route_urls, benchmark_user
+
+# lines of EXPLAIN QUERY PLAN worth a look: a table read from start to end, a sort the index doesn't provide
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW)(?!.*VIRTUAL TABLE)(?!\()(?P<table>\S+)')
+TEMP_BTREE = re.compile(r'USE TEMP B-TREE FOR (?P<purpose>.+)$')
+EXPLAINED = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+# routes that only query the database once given a search
+QUERY_STRINGS = {'search': 'q=book', 'username-autocomplete': 'q=seed'}
+# findings that are the point of the query rather than a missing index
+EXPECTED = {
+    ('username-autocomplete', 'full scan of app_user'),  # the username trie is built from every active user
+    ('search', 'temporary b-tree for order by'),  # full-text matches are sorted by rank
+}
+
+
+class Command(BaseCommand):
+    help = "Request every page as a user, run EXPLAIN QUERY PLAN on the queries issued and flag scans and sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="username to log in as, defaults to the user following the most people")
+        parser.add_argument('--route', action='append', dest='routes', help="only audit this url name")
+        parser.add_argument('--host', default='localhost', help="Host header sent, must be in ALLOWED_HOSTS")
+        parser.add_argument('--ignore-table', action='append', dest='ignored_tables', default=[],
+                            help="don't flag scans of this table, for tables known to stay small")
+        parser.add_argument('--verbose-plans', action='store_true', help="print the plan of every query")
+        parser.add_argument('--fail-on-issues', action='store_true', help="exit with an error when a plan is flagged")
+
+    def handle(self, *args, **options):
+        user = benchmark_user(options['user'])
+        client = Client(HTTP_HOST=options['host'])
+        client.force_login(user)
+        ignored_tables = set(options['ignored_tables'])
+
+        issues = 0
+        for name, path in route_urls(user, options['routes']):
+            if name in QUERY_STRINGS:
+                path = f'{path}?{QUERY_STRINGS[name]}'
+            with ExitStack() as stack:
+                contexts = {alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+                            for alias in connections}
+                client.get(path)
+            queries = [(alias, query['sql']) for alias, context in contexts.items() for query in context.captured_queries]
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} {path}: {len(queries)} queries"))
+
+            for alias, sql in queries:
+                if not sql.lstrip().upper().startswith(EXPLAINED):
+                    continue
+                plan = self.explain(connections[alias], sql)
+                flags = [flag for line in plan
+                         if (flag := self.flag(line, ignored_tables)) and (name, flag) not in EXPECTED]
+                if flags:
+                    issues += 1
+                    self.stdout.write(self.style.WARNING(f"  {', '.join(flags)}"))
+                if flags or options['verbose_plans']:
+                    self.stdout.write(f"    {sql}")
+                    for line in plan:
+                        self.stdout.write(f"      {line}")
+
+        summary = f"{issues} queries with a full scan or a temporary sort"
+        if issues and options['fail_on_issues']:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if issues else self.style.SUCCESS(summary))
+
+    def explain(self, connection, sql):
+        # the captured sql has its parameters inlined already
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def flag(self, line, ignored_tables):
+        if match := FULL_SCAN.match(line):
+            table = match.group('table')
+            return None if table in ignored_tables else f"full scan of {table}"
+        if match := TEMP_BTREE.search(line):
+            return f"temporary b-tree for {match.group('purpose').lower()}"
+        return None
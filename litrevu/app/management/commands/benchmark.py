@@ -0,0 +1,99 @@
+import json
+from contextlib import ExitStack
+from statistics import mean
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from app.middleware import percentile_of, PERCENTILES
+from ._routes import route_urls, benchmark_user
+
+
+class Command(BaseCommand):
+    help = "Request every page of the app as a user and report latency percentiles and query counts as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="username to log in as, defaults to the user following the most people")
+        parser.add_argument('--route', action='append', dest='routes', help="only benchmark this url name")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2, help="untimed requests sent first to each route")
+        parser.add_argument('--host', default='localhost', help="Host header sent, must be in ALLOWED_HOSTS")
+        parser.add_argument('--output', help="write the results to this file instead of stdout")
+        parser.add_argument('--baseline', help="results of a previous run to compare against")
+        parser.add_argument('--threshold', type=float, default=1.2,
+                            help="flag routes whose p50 latency grew by more than this factor over the baseline")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        user = benchmark_user(options['user'])
+        client = Client(HTTP_HOST=options['host'])
+        client.force_login(user)
+
+        results = {}
+        for name, path in route_urls(user, options['routes']):
+            results[name] = self.benchmark(client, path, options['iterations'], options['warmup'])
+            self.stderr.write(f"{name}: p50 {results[name]['latency_ms']['p50']:.1f}ms, "
+                              f"{results[name]['queries']['max']} queries")
+
+        report = {'user': user.username, 'iterations': options['iterations'], 'routes': results}
+        regressions = []
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                regressions = self.compare(report, json.load(baseline), options['threshold'])
+            report['regressions'] = regressions
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} route(s) slower than the baseline: "
+                               f"{', '.join(regression['route'] for regression in regressions)}")
+
+    def benchmark(self, client, path, iterations, warmup):
+        for _ in range(warmup):
+            client.get(path)
+
+        latencies, query_counts, statuses = [], [], set()
+        for _ in range(iterations):
+            with ExitStack() as stack:
+                contexts = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+                start = perf_counter()
+                response = client.get(path)
+                latencies.append((perf_counter() - start) * 1000)
+            query_counts.append(sum(len(context.captured_queries) for context in contexts))
+            statuses.add(response.status_code)
+
+        latencies.sort()
+        return {
+            'path': path,
+            'status': sorted(statuses),
+            'latency_ms': {
+                'mean': mean(latencies),
+                **{f'p{percentile}': percentile_of(latencies, percentile) for percentile in PERCENTILES},
+            },
+            'queries': {'min': min(query_counts), 'max': max(query_counts)},
+        }
+
+    def compare(self, report, baseline, threshold):
+        regressions = []
+        for name, result in report['routes'].items():
+            previous = baseline.get('routes', {}).get(name)
+            if previous is None:
+                continue
+            ratio = result['latency_ms']['p50'] / previous['latency_ms']['p50']
+            result['baseline_ratio'] = ratio
+            if ratio > threshold or result['queries']['max'] > previous['queries']['max']:
+                regressions.append({
+                    'route': name,
+                    'latency_ratio': ratio,
+                    'queries': result['queries']['max'],
+                    'baseline_queries': previous['queries']['max'],
+                })
+        return regressions
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from statistics import mean
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from app.middleware import percentile_of, PERCENTILES
+from ._inprocess import wsgi_request, asgi_request
+from ._routes import route_urls, benchmark_user
+
+# server interface and urlconf of each mode, asgi-sync shows what ASGI costs before any view is async
+MODES = {
+    'wsgi': ('wsgi', 'litrevu.urls'),
+    'asgi-sync': ('asgi', 'litrevu.urls'),
+    'asgi-async': ('asgi', 'litrevu.async_urls'),
+}
+
+
+class Command(BaseCommand):
+    help = "Compare the throughput of the sync views under WSGI and the async views under ASGI with concurrent clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="username to log in as, defaults to the user following the most people")
+        parser.add_argument('--route', action='append', dest='routes',
+                            help="only benchmark this url name, defaults to the routes that have an async view")
+        parser.add_argument('--mode', action='append', dest='modes', choices=MODES)
+        parser.add_argument('--requests', type=int, default=200, help="requests sent to each route in each mode")
+        parser.add_argument('--concurrency', type=int, default=16, help="clients sending requests at the same time")
+        parser.add_argument('--host', default='localhost', help="Host header sent, must be in ALLOWED_HOSTS")
+        parser.add_argument('--output', help="write the results to this file instead of stdout")
+
+    def handle(self, *args, **options):
+        from litrevu.asgi import application as asgi_application
+        from litrevu.wsgi import application as wsgi_application
+        self.applications = {'wsgi': wsgi_application, 'asgi': asgi_application}
+        self.host = options['host']
+
+        user = benchmark_user(options['user'])
+        client = Client(HTTP_HOST=self.host)
+        client.force_login(user)
+        self.headers = [('Cookie', f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}')]
+        routes = list(route_urls(user, options['routes'] or ['feeds', 'posts', 'user-follow']))
+
+        results = {}
+        for mode in options['modes'] or list(MODES):
+            interface, urlconf = MODES[mode]
+            results[mode] = {}
+            with override_settings(ROOT_URLCONF=urlconf):
+                for name, path in routes:
+                    if interface == 'wsgi':
+                        run = self.run_wsgi(path, options['requests'], options['concurrency'])
+                    else:
+                        run = asyncio.run(self.run_asgi(path, options['requests'], options['concurrency']))
+                    results[mode][name] = self.summarize(path, *run)
+                    self.stderr.write(f"{mode} {name}: {results[mode][name]['throughput']:.1f} req/s, "
+                                      f"p50 {results[mode][name]['latency_ms']['p50']:.1f}ms")
+
+        report = {
+            'user': user.username,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'modes': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+    def timed_wsgi_request(self, path):
+        start = perf_counter()
+        status, _, _ = wsgi_request(self.applications['wsgi'], 'GET', path, self.headers, host=self.host)
+        return status, (perf_counter() - start) * 1000
+
+    def run_wsgi(self, path, requests, concurrency):
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(executor.map(self.timed_wsgi_request, [path] * requests))
+        return samples, perf_counter() - start
+
+    async def run_asgi(self, path, requests, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed_request():
+            async with slots:
+                start = perf_counter()
+                status, _, _ = await asgi_request(self.applications['asgi'], 'GET', path, self.headers, host=self.host)
+                return status, (perf_counter() - start) * 1000
+
+        start = perf_counter()
+        samples = await asyncio.gather(*(timed_request() for _ in range(requests)))
+        return samples, perf_counter() - start
+
+    def summarize(self, path, samples, elapsed):
+        latencies = sorted(latency for _, latency in samples)
+        return {
+            'path': path,
+            'throughput': len(samples) / elapsed,
+            'errors': sum(1 for status, _ in samples if status >= 400),
+            'latency_ms': {
+                'mean': mean(latencies),
+                **{f'p{percentile}': percentile_of(latencies, percentile) for percentile in PERCENTILES},
+            },
+        }
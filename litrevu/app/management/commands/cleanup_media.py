@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.models import Ticket
+from app.images import RENDITION_WIDTHS, rendition_name
+
+
+class Command(BaseCommand):
+    help = "Delete the uploaded images and renditions that no ticket points to any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help="seconds a file must have existed before it can be deleted, protects uploads "
+                                 "whose ticket isn't saved yet")
+        parser.add_argument('--dry-run', action='store_true', help="list the files without deleting them")
+
+    def handle(self, *args, min_age, dry_run, **options):
+        referenced = set()
+        for name in Ticket.all_objects.exclude(image='').exclude(image__isnull=True)\
+                .values_list('image', flat=True).distinct().iterator():
+            referenced.add(name)
+            referenced.update(rendition_name(name, width) for width in RENDITION_WIDTHS)
+
+        deleted = freed = 0
+        deadline = time.time() - min_age
+        for directory, _, filenames in os.walk(settings.MEDIA_ROOT):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > deadline:
+                    continue
+                self.stdout.write(name)
+                if not dry_run:
+                    os.remove(path)
+                deleted += 1
+                freed += stat.st_size
+
+        action = "would be deleted" if dry_run else "deleted"
+        self.stdout.write(self.style.SUCCESS(f"{deleted} unreferenced files {action}, {freed / 1024 / 1024:.1f} MB"))
@@ -0,0 +1,44 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from app.models import Ticket, Review, UserFollows
+from ._records import FIELDS, FORMATS, RecordWriter, guess_format, open_file
+
+# queried columns, in the order of FIELDS
+COLUMNS = {
+    'tickets': (Ticket, ('id', 'user__username', 'title', 'description', 'image', 'time_created')),
+    'reviews': (Review, ('id', 'ticket_id', 'user__username', 'rating', 'headline', 'body', 'time_created')),
+    'follows': (UserFollows, ('user__username', 'followed_user__username')),
+}
+
+
+class Command(BaseCommand):
+    help = "Export tickets, reviews or follows as JSONL or CSV, streaming the rows from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=FIELDS)
+        parser.add_argument('--output', default='-', help="file to write, stdout by default")
+        parser.add_argument('--format', choices=FORMATS, help="guessed from the extension of the output by default")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="rows fetched from the database at once")
+
+    def handle(self, *args, kind, output, format, chunk_size, **options):
+        model, columns = COLUMNS[kind]
+        rows = model.objects.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+        exported = 0
+        start = perf_counter()
+        with open_file(output, 'w') as file:
+            writer = RecordWriter(file, guess_format(output, format), FIELDS[kind])
+            for row in rows:
+                writer.write([serialize(value) for value in row])
+                exported += 1
+                if exported % chunk_size == 0:
+                    self.stderr.write(f"{exported} {kind} exported, {exported / (perf_counter() - start):.0f} rows/s")
+        self.stderr.write(self.style.SUCCESS(f"{exported} {kind} exported in {perf_counter() - start:.1f}s"))
+
+
+def serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    # empty image fields are exported as missing values
+    return value if value != '' else None
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from app.models import Ticket
+from app import images
+
+
+class Command(BaseCommand):
+    help = "Generate the resized renditions of ticket images uploaded before they existed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="regenerate renditions that already exist")
+
+    def handle(self, *args, force, **options):
+        names = Ticket.objects.exclude(image='').exclude(image__isnull=True)\
+            .values_list('image', flat=True).distinct().iterator()
+        generated = failed = 0
+        for name in names:
+            if not force and images.has_renditions(name):
+                continue
+            try:
+                images.generate_renditions(name)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f"{name}: {error}")
+            else:
+                generated += 1
+        self.stdout.write(self.style.SUCCESS(f"renditions generated for {generated} images, {failed} failed"))
@@ -0,0 +1,222 @@
+from itertools import islice
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app.models import User, Ticket, Review, UserFollows
+from app import counters, rollups, timeline
+from ._records import FIELDS, FORMATS, guess_format, open_file, read_records
+
+# ids per query when looking up the users or tickets touched by an import
+LOOKUP_CHUNK = 500
+MAX_REPORTED_ERRORS = 20
+
+
+class UsernameCache:
+    """Maps usernames to user ids, the unknown usernames of each batch are resolved with a single query."""
+
+    def __init__(self, create=False):
+        self.create = create
+        self.ids = {}
+        self.missing = set()
+
+    def resolve(self, usernames):
+        unknown = set(usernames) - self.ids.keys() - self.missing
+        if not unknown:
+            return
+        found = dict(User.objects.filter(username__in=unknown).values_list('username', 'pk'))
+        if self.create and len(found) < len(unknown):
+            User.objects.bulk_create(
+                [User(username=username, password=make_password(None)) for username in unknown - found.keys()],
+                ignore_conflicts=True,
+            )
+            found = dict(User.objects.filter(username__in=unknown).values_list('username', 'pk'))
+        self.ids.update(found)
+        self.missing.update(unknown - found.keys())
+
+    def get(self, username):
+        if username not in self.ids:
+            raise ValueError(f"unknown user {username}")
+        return self.ids[username]
+
+
+class Command(BaseCommand):
+    help = "Import tickets, reviews or follows from a JSONL or CSV file with batched inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=FIELDS,
+                            help="reviews reference their ticket by id, import the tickets with their ids first")
+        parser.add_argument('path', help="file to read, - for stdin")
+        parser.add_argument('--format', choices=FORMATS, help="guessed from the extension of the file by default")
+        parser.add_argument('--batch-size', type=int, default=1000, help="rows inserted per transaction")
+        parser.add_argument('--create-users', action='store_true',
+                            help="create the users missing from the database, with an unusable password")
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help="leave the timelines, counters and rollups stale, run rebuild_timelines, "
+                                 "repair_counters and rebuild_rollups once every file is imported")
+
+    def handle(self, *args, kind, path, format, batch_size, create_users, skip_rebuild, **options):
+        self.usernames = UsernameCache(create=create_users)
+        # users whose timelines or counters the import changes
+        self.user_ids, self.ticket_ids, self.owner_ids, self.followed_ids = set(), set(), set(), set()
+        self.errors = 0
+        model = {'tickets': Ticket, 'reviews': Review, 'follows': UserFollows}[kind]
+        build = getattr(self, f'build_{kind}')
+
+        imported = present = 0
+        start = perf_counter()
+        with open_file(path, 'r') as file:
+            records = enumerate(read_records(file, guess_format(path, format)), start=1)
+            while chunk := list(islice(records, batch_size)):
+                objects = list(build(chunk))
+                with transaction.atomic():
+                    # rows already imported (same id, same follow) are left out, an import can be run again
+                    new_objects = self.new_objects(model, objects)
+                    model.objects.bulk_create(new_objects, batch_size=batch_size, ignore_conflicts=True)
+                imported += len(new_objects)
+                present += len(objects) - len(new_objects)
+                self.stdout.write(f"{imported} {kind} imported, {present} already present, {self.errors} skipped, "
+                                  f"{(imported + present) / (perf_counter() - start):.0f} rows/s")
+
+        if not skip_rebuild:
+            self.rebuild(kind)
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} {kind} imported, {present} already present, {self.errors} skipped "
+            f"in {perf_counter() - start:.1f}s"
+        ))
+
+    def new_objects(self, model, objects):
+        """The objects whose id or follow is neither in the table nor earlier in the batch."""
+        if model is UserFollows:
+            keys = [(follow.user_id, follow.followed_user_id) for follow in objects]
+            existing = set()
+            for user_ids in in_chunks({user_id for user_id, _ in keys}):
+                existing.update(UserFollows.objects.filter(user_id__in=user_ids)
+                                .filter(followed_user_id__in={followed_id for _, followed_id in keys})
+                                .values_list('user_id', 'followed_user_id'))
+        else:
+            # ids read from a CSV file are still strings
+            keys = [model._meta.pk.to_python(instance.pk) for instance in objects]
+            existing = set()
+            for ids in in_chunks({pk for pk in keys if pk is not None}):
+                existing.update(model.all_objects.filter(pk__in=ids).values_list('pk', flat=True))
+        new_objects = []
+        for key, instance in zip(keys, objects):
+            if key is None or key not in existing:
+                new_objects.append(instance)
+                existing.add(key)
+        return new_objects
+
+    def skip(self, line, error):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            message = '; '.join(error.messages) if isinstance(error, ValidationError) else str(error)
+            self.stderr.write(f"record {line} skipped: {message}")
+
+    def build_tickets(self, chunk):
+        self.usernames.resolve(record['user'] for _, record in chunk if 'user' in record)
+        for line, record in chunk:
+            try:
+                ticket = Ticket(
+                    pk=record.get('id'),
+                    user_id=self.usernames.get(record['user']),
+                    title=record.get('title', ''),
+                    description=record.get('description', ''),
+                    image=record.get('image'),
+                    time_created=parse_time(record.get('time_created')),
+                )
+                ticket.clean_fields(exclude=['user', 'image'])
+            except (KeyError, ValueError, ValidationError) as error:
+                self.skip(line, error)
+                continue
+            self.user_ids.add(ticket.user_id)
+            yield ticket
+
+    def build_reviews(self, chunk):
+        self.usernames.resolve(record['user'] for _, record in chunk if 'user' in record)
+        ticket_ids = {int(record['ticket']) for _, record in chunk if str(record.get('ticket', '')).isdigit()}
+        owners = dict(Ticket.objects.filter(pk__in=ticket_ids).values_list('pk', 'user_id'))
+        for line, record in chunk:
+            try:
+                ticket_id = int(record['ticket'])
+                if ticket_id not in owners:
+                    raise ValueError(f"unknown ticket {ticket_id}")
+                review = Review(
+                    pk=record.get('id'),
+                    ticket_id=ticket_id,
+                    user_id=self.usernames.get(record['user']),
+                    rating=int(record['rating']),
+                    headline=record.get('headline', ''),
+                    body=record.get('body', ''),
+                    time_created=parse_time(record.get('time_created')),
+                )
+                review.clean_fields(exclude=['user', 'ticket'])
+            except (KeyError, ValueError, ValidationError) as error:
+                self.skip(line, error)
+                continue
+            self.user_ids.add(review.user_id)
+            self.ticket_ids.add(ticket_id)
+            self.owner_ids.add(owners[ticket_id])
+            yield review
+
+    def build_follows(self, chunk):
+        self.usernames.resolve(
+            username for _, record in chunk for username in (record.get('user'), record.get('followed_user')) if username
+        )
+        for line, record in chunk:
+            try:
+                user_id = self.usernames.get(record['user'])
+                followed_user_id = self.usernames.get(record['followed_user'])
+                if user_id == followed_user_id:
+                    raise ValueError("a user can't follow themselves")
+            except (KeyError, ValueError) as error:
+                self.skip(line, error)
+                continue
+            self.user_ids.add(user_id)
+            self.followed_ids.add(followed_user_id)
+            yield UserFollows(user_id=user_id, followed_user_id=followed_user_id)
+
+    def rebuild(self, kind):
+        # bulk_create doesn't send the signals that maintain the timelines, counters and rollups
+        if kind == 'follows':
+            for user_ids in in_chunks(self.user_ids | self.followed_ids):
+                counters.repair_users(queryset=User.objects.filter(pk__in=user_ids))
+            timeline_ids = self.user_ids
+        else:
+            for ticket_ids in in_chunks(self.ticket_ids):
+                counters.repair_tickets(queryset=Ticket.objects.filter(pk__in=ticket_ids))
+                rollups.rebuild_tickets(queryset=Ticket.objects.filter(pk__in=ticket_ids))
+                # the timelines showing these tickets before the import see new counters
+                timeline.touch_items(ticket_ids=ticket_ids)
+            if kind == 'reviews':
+                for user_ids in in_chunks(self.user_ids):
+                    rollups.rebuild_users(queryset=User.objects.filter(pk__in=user_ids))
+            timeline_ids = self.user_ids | self.owner_ids
+            for user_ids in in_chunks(self.user_ids):
+                timeline_ids.update(
+                    UserFollows.objects.filter(followed_user_id__in=user_ids).values_list('user_id', flat=True)
+                )
+        timeline_ids = sorted(timeline_ids)
+        for start in range(0, len(timeline_ids), 100):
+            timeline.rebuild(timeline_ids[start:start + 100])
+        self.stdout.write(f"timelines of {len(timeline_ids)} users rebuilt")
+
+
+def in_chunks(ids, size=LOOKUP_CHUNK):
+    ids = sorted(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def parse_time(value):
+    if value is None:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"invalid date {value}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
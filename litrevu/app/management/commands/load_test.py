@@ -0,0 +1,370 @@
+import asyncio
+import csv
+import json
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from io import BytesIO
+from statistics import mean
+from time import perf_counter
+
+import django
+from PIL import Image
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.backends.signals import connection_created
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from django.urls import reverse
+from urllib.parse import urlencode
+
+from app.middleware import percentile_of, PERCENTILES
+from app.models import User
+from ._inprocess import wsgi_request, asgi_request
+from .benchmark_asgi import MODES
+
+# share of the iterations of a virtual user spent on each scenario, overridden with --mix
+DEFAULT_MIX = {'read': 60, 'create': 15, 'follow': 15, 'login': 10}
+SAMPLE_FIELDS = ('mode', 'scenario', 'step', 'status', 'ok', 'latency_ms')
+
+
+class LockWaits:
+    """
+    Execute wrapper retrying the statements that fail with "database is locked".
+
+    The load test turns sqlite's busy_timeout off so that lock waits happen here, where they are counted,
+    instead of inside sqlite. A statement is retried with a growing pause until timeout seconds passed.
+    A transaction whose snapshot went stale (SQLITE_BUSY_SNAPSHOT: it read, then another connection
+    committed a write before it could write) can never succeed, sqlite doesn't wait for those either.
+    """
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        self.installed = False
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.waited = 0.0
+        self.failures = 0
+        self.stale_snapshots = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        deadline = None
+        pause = 0.001
+        while True:
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as error:
+                if 'database is locked' not in str(error):
+                    raise
+                if getattr(error.__cause__, 'sqlite_errorname', None) == 'SQLITE_BUSY_SNAPSHOT':
+                    with self.lock:
+                        self.stale_snapshots += 1
+                    raise
+                deadline = deadline or perf_counter() + self.timeout
+                if perf_counter() >= deadline:
+                    with self.lock:
+                        self.failures += 1
+                    raise
+            time.sleep(pause)
+            with self.lock:
+                self.retries += 1
+                self.waited += pause
+            pause = min(pause * 2, 0.05)
+
+    def snapshot(self):
+        with self.lock:
+            return {'retries': self.retries, 'wait_seconds': self.waited, 'failures': self.failures,
+                    'stale_snapshots': self.stale_snapshots}
+
+    def install(self):
+        if self.installed:
+            return
+        # the connections opened before wouldn't retry
+        connections.close_all()
+        connection_created.connect(self.connection_opened)
+        self.installed = True
+
+    def connection_opened(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, self)
+
+
+# one per process, connections kept open by the server threads carry it from one mode to the next
+lock_waits = LockWaits()
+
+
+class Browser:
+    """Cookies of one virtual user, every request it sends is timed and appended to samples."""
+
+    def __init__(self, mode, samples):
+        self.mode = mode
+        self.samples = samples
+        self.cookies = {}
+
+    def prepare(self, method, data):
+        """Headers and body of a request posting data, files are sent as multipart."""
+        headers = [('Cookie', '; '.join(f'{name}={value}' for name, value in self.cookies.items()))]
+        if 'csrftoken' in self.cookies:
+            headers.append(('X-CSRFToken', self.cookies['csrftoken']))
+        if method == 'GET':
+            return headers, b''
+        if any(hasattr(value, 'read') for value in data.values()):
+            return headers + [('Content-Type', MULTIPART_CONTENT)], encode_multipart(BOUNDARY, data)
+        return headers + [('Content-Type', 'application/x-www-form-urlencoded')], urlencode(data).encode()
+
+    def record(self, scenario, step, expect, start, response):
+        status, headers, _ = response
+        for name, value in headers:
+            if name.lower() == 'set-cookie':
+                for morsel in SimpleCookie(value).values():
+                    self.cookies[morsel.key] = morsel.value
+        self.samples.append((self.mode, scenario, step, status, status in expect, (perf_counter() - start) * 1000))
+
+    def run(self, send, scenario, steps):
+        for step, method, url, data, expect in steps:
+            headers, body = self.prepare(method, data)
+            start = perf_counter()
+            try:
+                response = send(method, url, headers, body)
+            except Exception:
+                # an exception escaping the application is recorded as a failed request with status 0
+                response = (0, [], b'')
+            self.record(scenario, step, expect, start, response)
+
+    async def arun(self, send, scenario, steps):
+        for step, method, url, data, expect in steps:
+            headers, body = self.prepare(method, data)
+            start = perf_counter()
+            try:
+                response = await send(method, url, headers, body)
+            except Exception:
+                response = (0, [], b'')
+            self.record(scenario, step, expect, start, response)
+
+
+# each scenario returns its steps: (name, method, url, posted data, expected statuses)
+
+def login(browser, user, rng):
+    browser.cookies.clear()
+    return [
+        # the login page sets the csrftoken cookie that the form post is checked against
+        ('login page', 'GET', reverse('login'), None, (200,)),
+        ('login', 'POST', reverse('login'), {'username': user['username'], 'password': user['password']}, (302,)),
+    ]
+
+
+def read(browser, user, rng):
+    return [
+        ('feed', 'GET', reverse('feeds'), None, (200,)),
+        ('posts', 'GET', reverse('posts'), None, (200,)),
+        ('feed api', 'GET', reverse('api-feeds'), None, (200,)),
+    ]
+
+
+def create(browser, user, rng):
+    image = BytesIO()
+    Image.new('RGB', (64, 64), tuple(rng.randrange(256) for _ in range(3))).save(image, format='PNG')
+    image.seek(0)
+    image.name = 'cover.png'
+    return [('ticket and review', 'POST', reverse('create-review-and-ticket'), {
+        'title': f'Load test {rng.randrange(10 ** 9)}',
+        'description': 'Posted by the load_test command',
+        'image': image,
+        'review_headline': 'Load test review',
+        'review_rating': str(rng.randrange(6)),
+        'review_body': 'Posted by the load_test command',
+    }, (302,))]
+
+
+def follow(browser, user, rng):
+    username = rng.choice(user['others'])
+    return [
+        # an already followed user gets the form back with an error
+        ('follow', 'POST', reverse('user-follow'), {'follow_username': username}, (200, 302)),
+        ('unfollow', 'POST', reverse('user-follow-bulk'), {'username': username, 'unfollow': '1'}, (200,)),
+    ]
+
+
+SCENARIOS = {'read': read, 'create': create, 'follow': follow, 'login': login}
+
+
+def iterations(browser, user, mix, duration, rng):
+    """Yield the scenario name and steps of each iteration of a virtual user, logging in first."""
+    yield 'login', login(browser, user, rng)
+    deadline = perf_counter() + duration
+    names, weights = list(mix), list(mix.values())
+    while perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        yield name, SCENARIOS[name](browser, user, rng)
+
+
+def run_users(config):
+    """
+    Run the virtual users of config until the duration ends and return their samples.
+
+    Under WSGI each virtual user is a thread sending its requests one at a time, under ASGI they are
+    tasks sharing one event loop, as the clients of a single server process would.
+    """
+    from litrevu.asgi import application as asgi_application
+    from litrevu.wsgi import application as wsgi_application
+
+    interface, _ = MODES[config['mode']]
+    samples = []
+    browsers = [Browser(config['mode'], samples) for _ in config['users']]
+    runs = [
+        iterations(browser, user, config['mix'], config['duration'], random.Random(config['seed'] + index))
+        for index, (browser, user) in enumerate(zip(browsers, config['users']))
+    ]
+
+    if interface == 'wsgi':
+        def send(method, url, headers, body):
+            return wsgi_request(wsgi_application, method, url, headers, body, host=config['host'])
+
+        def user_thread(browser, run):
+            for scenario, steps in run:
+                browser.run(send, scenario, steps)
+
+        with ThreadPoolExecutor(max_workers=len(browsers)) as executor:
+            list(executor.map(user_thread, browsers, runs))
+    else:
+        async def send(method, url, headers, body):
+            return await asgi_request(asgi_application, method, url, headers, body, host=config['host'])
+
+        async def user_task(browser, run):
+            for scenario, steps in run:
+                await browser.arun(send, scenario, steps)
+
+        async def all_users():
+            await asyncio.gather(*(user_task(browser, run) for browser, run in zip(browsers, runs)))
+
+        asyncio.run(all_users())
+    return samples
+
+
+def run_process(config):
+    """Run the virtual users of one process, returns their samples, the lock waits and the seconds the run took."""
+    lock_waits.timeout = config['lock_timeout']
+    lock_waits.install()
+    before = lock_waits.snapshot()
+    _, urlconf = MODES[config['mode']]
+    start = perf_counter()
+    with override_settings(ROOT_URLCONF=urlconf, SQLITE_PRAGMAS={**settings.SQLITE_PRAGMAS, 'busy_timeout': 0}):
+        samples = run_users(config)
+    elapsed = perf_counter() - start
+    return samples, {name: value - before[name] for name, value in lock_waits.snapshot().items()}, elapsed
+
+
+class Command(BaseCommand):
+    help = "Load the WSGI and ASGI applications in-process with concurrent virtual users logging in, reading, " \
+           "posting and following, and report throughput, latencies, errors and sqlite lock waits"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', action='append', dest='modes', choices=MODES)
+        parser.add_argument('--users', type=int, default=16, help="virtual users per process")
+        parser.add_argument('--processes', type=int, default=0,
+                            help="worker processes, each with --users virtual users, 0 runs them in this process; "
+                                 "use a shared cache backend with several processes")
+        parser.add_argument('--duration', type=float, default=30, help="seconds each mode runs for")
+        parser.add_argument('--mix', help="weights of the scenarios, e.g. read=60,create=15,follow=15,login=10")
+        parser.add_argument('--prefix', default='seed', help="prefix of the usernames of the users logged in")
+        parser.add_argument('--password', default='password', help="password of these users, see seed_data")
+        parser.add_argument('--lock-timeout', type=float, default=5,
+                            help="seconds a statement is retried for while the database is locked")
+        parser.add_argument('--seed', type=int, default=0, help="seed of the random choices of the virtual users")
+        parser.add_argument('--host', default='localhost', help="Host header sent, must be in ALLOWED_HOSTS")
+        parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+        parser.add_argument('--samples', help="write every request to this CSV file")
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix']) if options['mix'] else DEFAULT_MIX
+        processes = options['processes']
+        usernames = list(User.objects.filter(is_active=True, username__startswith=options['prefix'])
+                         .order_by('pk').values_list('username', flat=True)[:options['users'] * max(processes, 1)])
+        if len(usernames) < 2:
+            raise CommandError(f"at least two users named {options['prefix']}..., run seed_data first")
+        users = [{'username': username, 'password': options['password'],
+                  'others': [other for other in usernames if other != username]} for username in usernames]
+
+        results, samples = {}, []
+        for mode in options['modes'] or list(MODES):
+            configs = [
+                {'mode': mode, 'users': users[index::max(processes, 1)], 'mix': mix, 'duration': options['duration'],
+                 'seed': options['seed'] + index * len(users), 'host': options['host'],
+                 'lock_timeout': options['lock_timeout']}
+                for index in range(max(processes, 1))
+            ]
+            if processes:
+                # spawned rather than forked, a forked child would share the open sqlite connections
+                with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=django.setup) as executor:
+                    runs = list(executor.map(run_process, configs))
+            else:
+                runs = [run_process(configs[0])]
+            # the processes run side by side, starting them isn't part of the measure
+            elapsed = max(run_elapsed for *_, run_elapsed in runs)
+
+            mode_samples = [sample for run_samples, *_ in runs for sample in run_samples]
+            locks = {name: sum(run_locks[name] for _, run_locks, _ in runs) for name in runs[0][1]}
+            results[mode] = self.summarize(mode_samples, elapsed, locks)
+            samples.extend(mode_samples)
+            self.stderr.write(f"{mode}: {results[mode]['throughput']:.1f} req/s, "
+                              f"{results[mode]['error_rate']:.1%} errors, "
+                              f"p95 {results[mode]['latency_ms']['p95']:.0f}ms, "
+                              f"{locks['retries']} lock retries ({locks['wait_seconds']:.2f}s)")
+
+        report = {
+            'users': len(users),
+            'processes': processes,
+            'duration': options['duration'],
+            'mix': mix,
+            'modes': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if options['samples']:
+            with open(options['samples'], 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(SAMPLE_FIELDS)
+                writer.writerows(samples)
+
+    def parse_mix(self, value):
+        try:
+            mix = {name: float(weight) for name, weight in (item.split('=') for item in value.split(','))}
+        except ValueError:
+            raise CommandError(f"invalid --mix {value}, expected name=weight pairs")
+        if unknown := mix.keys() - SCENARIOS.keys():
+            raise CommandError(f"unknown scenarios {', '.join(sorted(unknown))}, choose among {', '.join(SCENARIOS)}")
+        return mix
+
+    def summarize(self, samples, elapsed, locks):
+        steps = {}
+        for _, scenario, step, status, ok, latency in samples:
+            steps.setdefault(f'{scenario}: {step}', []).append((ok, latency))
+        return {
+            **self.latency_summary([(ok, latency) for *_, ok, latency in samples], elapsed),
+            'database_locked': locks,
+            'steps': {name: self.latency_summary(step_samples, elapsed)
+                      for name, step_samples in sorted(steps.items())},
+        }
+
+    def latency_summary(self, samples, elapsed):
+        latencies = sorted(latency for _, latency in samples)
+        errors = sum(1 for ok, _ in samples if not ok)
+        return {
+            'requests': len(samples),
+            'throughput': len(samples) / elapsed,
+            'errors': errors,
+            'error_rate': errors / len(samples) if samples else 0,
+            'latency_ms': {
+                'mean': mean(latencies) if latencies else None,
+                **{f'p{percentile}': percentile_of(latencies, percentile) for percentile in PERCENTILES},
+            },
+        }
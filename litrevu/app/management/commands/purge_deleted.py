@@ -0,0 +1,46 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app.models import Ticket, Review
+from app.images import delete_renditions
+
+
+class Command(BaseCommand):
+    help = "Hard-delete the soft-deleted tickets and reviews in small batches, with the image files nothing uses"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help="rows deleted per transaction, smaller batches hold the write lock for less time")
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help="seconds to wait between batches so that requests can write in between")
+
+    def handle(self, *args, batch_size, pause, **options):
+        # the reviews of a deleted ticket are flagged too, deleting them first keeps the ticket batches small
+        reviews = self.purge(Review.all_objects.filter(is_deleted=True), batch_size, pause)
+        tickets = images = 0
+        while batch := list(Ticket.all_objects.filter(is_deleted=True).values_list('pk', 'image')[:batch_size]):
+            with transaction.atomic():
+                Ticket.all_objects.filter(pk__in=[pk for pk, _ in batch]).delete()
+            tickets += len(batch)
+            images += self.delete_images({image for _, image in batch if image})
+            time.sleep(pause)
+        self.stdout.write(self.style.SUCCESS(f"{tickets} tickets, {reviews} reviews and {images} images purged"))
+
+    def purge(self, queryset, batch_size, pause):
+        purged = 0
+        while pks := list(queryset.values_list('pk', flat=True)[:batch_size]):
+            with transaction.atomic():
+                queryset.model.all_objects.filter(pk__in=pks).delete()
+            purged += len(pks)
+            time.sleep(pause)
+        return purged
+
+    def delete_images(self, names):
+        # identical uploads share one stored file, it stays while another ticket shows it
+        referenced = set(Ticket.all_objects.filter(image__in=names).values_list('image', flat=True))
+        for name in names - referenced:
+            default_storage.delete(name)
+            delete_renditions(name)
+        return len(names - referenced)
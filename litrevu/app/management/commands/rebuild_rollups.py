@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from app import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the weekly rating rollups of tickets and reviewers from the reviews, or compact them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=rollups.REBUILD_BATCH_SIZE,
+                            help="tickets or users recomputed per transaction")
+        parser.add_argument('--compact', action='store_true',
+                            help="only delete the buckets emptied by deleted reviews, without recomputing")
+
+    def handle(self, *args, batch_size, compact, **options):
+        if compact:
+            deleted = rollups.compact()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} empty buckets deleted"))
+            return
+        tickets = rollups.rebuild_tickets(batch_size)
+        users = rollups.rebuild_users(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"{tickets} ticket buckets and {users} reviewer buckets written"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from app import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of tickets and reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.REBUILD_BATCH_SIZE,
+                            help="ids indexed per transaction")
+
+    def handle(self, *args, batch_size, **options):
+        indexed = search.rebuild(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"{indexed} tickets and reviews indexed"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from app.models import User
+from app import timeline
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed feed timelines of every user from the existing tickets, reviews and follows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="number of users rebuilt per transaction")
+        parser.add_argument('--user', action='append', dest='usernames', help="only rebuild the timeline of this user")
+
+    def handle(self, *args, batch_size, usernames, **options):
+        users = User.objects.order_by('id')
+        if usernames:
+            users = users.filter(username__in=usernames)
+        user_ids = list(users.values_list('id', flat=True))
+
+        written = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            written += timeline.rebuild(batch)
+            self.stdout.write(f"{start + len(batch)}/{len(user_ids)} users rebuilt")
+        self.stdout.write(self.style.SUCCESS(f"{written} timeline entries written"))
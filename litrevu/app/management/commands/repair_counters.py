@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from app import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute the review counters of tickets and the follow counters of users from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=counters.REPAIR_BATCH_SIZE,
+                            help="rows updated per transaction")
+
+    def handle(self, *args, batch_size, **options):
+        tickets = counters.repair_tickets(batch_size)
+        users = counters.repair_users(batch_size)
+        self.stdout.write(self.style.SUCCESS(f"counters recomputed for {tickets} tickets and {users} users"))
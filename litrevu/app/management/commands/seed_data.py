@@ -0,0 +1,129 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from PIL import Image
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from app.models import User, Ticket, Review, UserFollows
+from app import counters, images, rollups, timeline
+
+
+class Command(BaseCommand):
+    help = "Seed the database with synthetic users, follows, tickets and reviews for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tickets', type=int, default=5000)
+        parser.add_argument('--reviews', type=int, default=10000)
+        parser.add_argument('--image-ratio', type=float, default=0.3, help="share of tickets with a cover image")
+        parser.add_argument('--max-follows', type=int, default=200, help="upper bound of follows per user")
+        parser.add_argument('--follow-exponent', type=float, default=1.5,
+                            help="pareto shape of the follows per user, lower means a heavier tail")
+        parser.add_argument('--days', type=int, default=365, help="spread the posts over that many past days")
+        parser.add_argument('--prefix', default='seed', help="prefix of the generated usernames")
+        parser.add_argument('--password', default='password', help="password of every generated user")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=None, help="random seed, for reproducible datasets")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'], options['prefix'], options['password'])
+            follows = self.create_follows(user_ids, options['max_follows'], options['follow_exponent'])
+            tickets = self.create_tickets(user_ids, options['tickets'], options['image_ratio'])
+            reviews = self.create_reviews(user_ids, tickets, options['reviews'])
+        self.stdout.write(
+            f"{len(user_ids)} users, {follows} follows, {len(tickets)} tickets, {reviews} reviews created"
+        )
+
+        # bulk_create doesn't send the signals that maintain the timelines, counters and rollups
+        for start in range(0, len(user_ids), 100):
+            timeline.rebuild(user_ids[start:start + 100])
+        counters.repair_tickets()
+        counters.repair_users()
+        rollups.rebuild_tickets()
+        rollups.rebuild_users()
+        self.stdout.write(self.style.SUCCESS("timelines, counters and rollups rebuilt"))
+
+    def random_date(self, after=None):
+        start = after or self.now - timedelta(days=self.days)
+        return start + (self.now - start) * self.random.random()
+
+    def create_users(self, count, prefix, password):
+        # hashing is slow on purpose, every seeded user shares the same hash
+        password = make_password(password)
+        first = User.objects.filter(username__startswith=f'{prefix}_').count()
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}_{first + i}', password=password) for i in range(count)],
+            batch_size=self.batch_size,
+        )
+        return [user.pk for user in users]
+
+    def create_follows(self, user_ids, max_follows, exponent):
+        """
+        Build a power-law follow graph: a few users follow a lot of people and a few users are
+        followed by almost everyone, most users sit in the long tail on both sides.
+        """
+        popularity = list(accumulate(1 / (rank + 1) for rank in range(len(user_ids))))
+        popular_first = self.random.sample(user_ids, len(user_ids))
+        follows = []
+        for user_id in user_ids:
+            degree = min(int(self.random.paretovariate(exponent)), max_follows, len(user_ids) - 1)
+            followed = set(self.random.choices(popular_first, cum_weights=popularity, k=degree))
+            followed.discard(user_id)
+            follows.extend(UserFollows(user_id=user_id, followed_user_id=followed_id) for followed_id in followed)
+        UserFollows.objects.bulk_create(follows, batch_size=self.batch_size, ignore_conflicts=True)
+        return len(follows)
+
+    def create_covers(self, count=5):
+        covers = []
+        for i in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (600, 900), color).save(buffer, format='JPEG')
+            name = default_storage.save(f'seed-cover-{i}.jpg', ContentFile(buffer.getvalue()))
+            images.generate_renditions(name)
+            covers.append(name)
+        return covers
+
+    def create_tickets(self, user_ids, count, image_ratio):
+        covers = self.create_covers() if image_ratio > 0 else []
+        tickets = [
+            Ticket(
+                title=f'Book {i}',
+                description=f'Looking for reviews of book {i}',
+                user_id=self.random.choice(user_ids),
+                image=self.random.choice(covers) if self.random.random() < image_ratio else None,
+                time_created=self.random_date(),
+            )
+            for i in range(count)
+        ]
+        return Ticket.objects.bulk_create(tickets, batch_size=self.batch_size)
+
+    def create_reviews(self, user_ids, tickets, count):
+        if not tickets:
+            return 0
+        reviews = []
+        for i in range(count):
+            ticket = self.random.choice(tickets)
+            reviews.append(Review(
+                ticket=ticket,
+                user_id=self.random.choice(user_ids),
+                rating=self.random.randint(0, 5),
+                headline=f'Review {i}',
+                body=f'Review {i} of {ticket.title}',
+                time_created=self.random_date(after=ticket.time_created),
+            ))
+        Review.objects.bulk_create(reviews, batch_size=self.batch_size)
+        return len(reviews)
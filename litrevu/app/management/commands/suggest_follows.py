@@ -0,0 +1,124 @@
+from itertools import chain
+from time import perf_counter
+
+import numpy as np
+from scipy import sparse
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from app.models import User, Review, UserFollows, FollowSuggestion
+
+
+class Command(BaseCommand):
+    help = "Rank the users each user could follow from the follow graph and shared reviews, and store the best ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help="suggestions stored per user")
+        parser.add_argument('--block-size', type=int, default=2000,
+                            help="users scored at once, the memory used grows with it")
+        parser.add_argument('--co-review-weight', type=float, default=0.5,
+                            help="score of a ticket reviewed by both users, a mutual follow scores 1")
+        parser.add_argument('--max-ticket-reviewers', type=int, default=1000,
+                            help="tickets reviewed by more users are left out, they say little and pair everyone")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="rows fetched from the database at once")
+
+    def handle(self, *args, top_k, block_size, co_review_weight, max_ticket_reviewers, chunk_size, **options):
+        start = perf_counter()
+        user_ids = np.fromiter(
+            User.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True).iterator(chunk_size),
+            dtype=np.int64,
+        )
+        users = len(user_ids)
+        follows = self.load_matrix(UserFollows.objects.values_list('user_id', 'followed_user_id'), user_ids,
+                                   user_ids, chunk_size)
+        reviewed = self.load_reviews(user_ids, max_ticket_reviewers, chunk_size)
+        self.stdout.write(f"{users} users, {follows.nnz} follows and {reviewed.nnz} reviewed tickets loaded "
+                          f"in {perf_counter() - start:.1f}s")
+
+        written = 0
+        reviewed_by = reviewed.T.tocsr()
+        for block_start in range(0, users, block_size):
+            block = slice(block_start, min(block_start + block_size, users))
+            written += self.suggest(user_ids, block, follows, reviewed, reviewed_by, top_k, co_review_weight)
+            self.stdout.write(f"{block.stop}/{users} users scored")
+        # the blocks only replace the rows of active users, the users deactivated since the last run keep theirs
+        cleared, _ = FollowSuggestion.objects.filter(Q(user__is_active=False) | Q(suggested_user__is_active=False))\
+            .delete()
+        self.stdout.write(f"{cleared} suggestions of inactive users cleared")
+        self.stdout.write(self.style.SUCCESS(f"{written} suggestions written in {perf_counter() - start:.1f}s"))
+
+    def load_matrix(self, queryset, row_ids, column_ids, chunk_size):
+        """
+        Read the pairs of ids of queryset into a 0/1 sparse matrix indexed by position in row_ids and column_ids,
+        the pairs with an id missing from them are dropped. Only int64 arrays are held, never a list of rows.
+        """
+        pairs = np.fromiter(chain.from_iterable(queryset.order_by().iterator(chunk_size)), dtype=np.int64)
+        rows, valid_rows = positions(row_ids, pairs[0::2])
+        columns, valid_columns = positions(column_ids, pairs[1::2])
+        valid = valid_rows & valid_columns
+        matrix = sparse.csr_matrix(
+            (np.ones(valid.sum(), dtype=np.int32), (rows[valid], columns[valid])),
+            shape=(len(row_ids), len(column_ids)),
+        )
+        # duplicated pairs are summed by the constructor
+        matrix.data[:] = 1
+        return matrix
+
+    def load_reviews(self, user_ids, max_ticket_reviewers, chunk_size):
+        """Users by tickets they reviewed, restricted to the tickets that at least two users reviewed."""
+        counts = Review.objects.order_by().values('ticket_id').annotate(reviewers=Count('user_id', distinct=True))
+        ticket_ids = np.fromiter(
+            counts.filter(reviewers__gte=2, reviewers__lte=max_ticket_reviewers).order_by('ticket_id')
+            .values_list('ticket_id', flat=True).iterator(chunk_size),
+            dtype=np.int64,
+        )
+        return self.load_matrix(Review.objects.values_list('user_id', 'ticket_id'), user_ids, ticket_ids, chunk_size)
+
+    def suggest(self, user_ids, block, follows, reviewed, reviewed_by, top_k, co_review_weight):
+        """Score every candidate of the users of block and replace their stored suggestions with the top_k."""
+        followed = follows[block]
+        # paths user -> followed user -> candidate, and tickets reviewed by both
+        mutual_follows = (followed @ follows).tocsr()
+        co_reviews = (reviewed[block] @ reviewed_by).tocsr()
+        scores = mutual_follows.astype(np.float32) + co_reviews.astype(np.float32) * co_review_weight
+
+        # the users already followed and the user themselves are not candidates
+        rows = np.arange(block.stop - block.start)
+        itself = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, rows + block.start)),
+                                   shape=scores.shape)
+        excluded = (followed + itself).astype(bool).astype(np.float32)
+        scores = (scores - scores.multiply(excluded)).tocsr()
+        scores.eliminate_zeros()
+
+        suggestions = []
+        for row in rows:
+            begin, end = scores.indptr[row], scores.indptr[row + 1]
+            if begin == end:
+                continue
+            values, columns = scores.data[begin:end], scores.indices[begin:end]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                values, columns = values[best], columns[best]
+            # best score first, the oldest account first on ties
+            order = np.lexsort((columns, -values))
+            values, columns = values[order], columns[order]
+            counts = zip(mutual_follows[row, columns].toarray().ravel(), co_reviews[row, columns].toarray().ravel())
+            user_id = int(user_ids[block.start + row])
+            suggestions.extend(
+                FollowSuggestion(user_id=user_id, suggested_user_id=int(user_ids[column]), rank=rank,
+                                 score=float(value), mutual_follows=int(mutual), co_reviews=int(shared))
+                for rank, (value, column, (mutual, shared)) in enumerate(zip(values, columns, counts))
+            )
+
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=user_ids[block].tolist()).delete()
+            FollowSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+        return len(suggestions)
+
+
+def positions(ids, values):
+    """Index of each of values in the sorted array ids, and whether it was found there."""
+    indexes = np.searchsorted(ids, values)
+    found = indexes < len(ids)
+    found[found] = ids[indexes[found]] == values[found]
+    return indexes, found
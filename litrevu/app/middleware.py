@@ -0,0 +1,215 @@
+import threading
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .database import read_only
+
+SAMPLE_SIZE = 1000
+METRICS = ('sql_queries', 'sql_time', 'render_time', 'view_time')
+PERCENTILES = (50, 95, 99)
+
+
+class RouteStats:
+    """Keeps the last SAMPLE_SIZE measurements of every metric for each url name, in memory."""
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.samples = defaultdict(lambda: {metric: deque(maxlen=self.sample_size) for metric in METRICS})
+        self.requests = defaultdict(int)
+
+    def record(self, route, **measurements):
+        with self.lock:
+            self.requests[route] += 1
+            for metric, value in measurements.items():
+                self.samples[route][metric].append(value)
+
+    def snapshot(self):
+        with self.lock:
+            samples = {route: {metric: sorted(values) for metric, values in metrics.items()}
+                       for route, metrics in self.samples.items()}
+            requests = dict(self.requests)
+        return {
+            route: {
+                'requests': requests[route],
+                **{metric: {f'p{percentile}': percentile_of(values, percentile) for percentile in PERCENTILES}
+                   for metric, values in metrics.items()},
+            }
+            for route, metrics in samples.items()
+        }
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.requests.clear()
+
+
+def percentile_of(sorted_values, percentile):
+    # nearest-rank percentile, values are already sorted
+    if not sorted_values:
+        return None
+    rank = max(0, -(-percentile * len(sorted_values) // 100) - 1)
+    return sorted_values[rank]
+
+
+route_stats = RouteStats()
+
+
+class CacheStats:
+    """Counts the hits and misses of the caches sitting on the request path, per cache name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, name, hit):
+        with self.lock:
+            self.counts[name]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            counts = {name: dict(values) for name, values in self.counts.items()}
+        return {
+            name: {**values, 'hit_ratio': values['hits'] / (values['hits'] + values['misses'])}
+            for name, values in counts.items()
+        }
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+
+cache_stats = CacheStats()
+# timings of the request being served, context variables follow the request into sync_to_async threads
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_queries += 1
+            self.sql_time += perf_counter() - start
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper installed on every database connection, see the connection_created receiver."""
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_query(execute, sql, params, many, context)
+
+
+class PerformanceMiddleware:
+    """
+    Measures SQL queries, SQL time, template render time and total view time of every request.
+
+    The measurements are sent back in a Server-Timing header and aggregated per url name in route_stats,
+    which the staff-only performance-stats view exposes.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, start)
+
+    async def __acall__(self, request):
+        start, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, start)
+
+    def start(self, request):
+        request.timings = RequestTimings()
+        return perf_counter(), current_timings.set(request.timings)
+
+    def finish(self, request, response, start):
+        timings = request.timings
+        # durations are reported in milliseconds
+        sql_time = timings.sql_time * 1000
+        render_time = timings.render_time * 1000
+        view_time = (perf_counter() - start) * 1000
+
+        response['Server-Timing'] = ', '.join([
+            f'sql;desc="{timings.sql_queries} queries";dur={sql_time:.1f}',
+            f'render;dur={render_time:.1f}',
+            f'view;dur={view_time:.1f}',
+        ])
+        if request.resolver_match and request.resolver_match.url_name:
+            route_stats.record(
+                request.resolver_match.url_name,
+                sql_queries=timings.sql_queries,
+                sql_time=sql_time,
+                render_time=render_time,
+                view_time=view_time,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # the response is rendered right after the template response middlewares run
+        start = perf_counter()
+
+        def rendered(response):
+            request.timings.render_time = perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ReadReplicaMiddleware:
+    """
+    Routes the reads of the views having a read_only_database attribute to the replica database.
+
+    The flag is set from process_view and cleared once the response is rendered, so the querysets
+    evaluated by the templates read from the replica too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            read_only.set(False)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            read_only.set(False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(getattr(view_func, 'view_class', None), 'read_only_database', False):
+            read_only.set(True)
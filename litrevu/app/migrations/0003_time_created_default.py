@@ -0,0 +1,24 @@
+# Generated by Django 4.2.4 on 2026-10-18 10:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='time_created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='time_created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:03
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def total(queryset, group_by, aggregate):
+    return Coalesce(
+        Subquery(queryset.filter(**{group_by: OuterRef('pk')}).order_by().values(group_by)
+                 .annotate(total=aggregate).values('total')),
+        Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def compute_counters(apps, schema_editor):
+    Ticket = apps.get_model('app', 'Ticket')
+    Review = apps.get_model('app', 'Review')
+    User = apps.get_model('app', 'User')
+    UserFollows = apps.get_model('app', 'UserFollows')
+    Ticket.objects.update(
+        review_count=total(Review.objects.all(), 'ticket', Count('id')),
+        rating_sum=total(Review.objects.all(), 'ticket', Sum('rating')),
+    )
+    User.objects.update(
+        followers_count=total(UserFollows.objects.all(), 'followed_user', Count('id')),
+        following_count=total(UserFollows.objects.all(), 'user', Count('id')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_time_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(compute_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:30
+
+from django.db import migrations
+
+# tickets and reviews share the index, a row's rowid is 2 * id for a ticket and 2 * id + 1 for a review
+# so that the triggers can find it without scanning
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE app_search_index USING fts5(
+        title, body, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_insert AFTER INSERT ON app_ticket BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_update AFTER UPDATE OF title, description ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_delete AFTER DELETE ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_insert AFTER INSERT ON app_review BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_update AFTER UPDATE OF headline, body ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_delete AFTER DELETE ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+    "INSERT INTO app_search_index (rowid, title, body) SELECT id * 2, title, description FROM app_ticket",
+    "INSERT INTO app_search_index (rowid, title, body) SELECT id * 2 + 1, headline, body FROM app_review",
+]
+
+DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS app_ticket_search_insert",
+    "DROP TRIGGER IF EXISTS app_ticket_search_update",
+    "DROP TRIGGER IF EXISTS app_ticket_search_delete",
+    "DROP TRIGGER IF EXISTS app_review_search_insert",
+    "DROP TRIGGER IF EXISTS app_review_search_update",
+    "DROP TRIGGER IF EXISTS app_review_search_delete",
+    "DROP TABLE IF EXISTS app_search_index",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is specific to sqlite
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_INDEX), run(DROP_INDEX)),
+    ]
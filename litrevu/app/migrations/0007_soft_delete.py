@@ -0,0 +1,82 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:18
+
+from django.db import migrations, models
+
+# the search index triggers of 0006_search_index, sqlite rebuilds a table to add a column and the triggers
+# of the old table go with it
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER app_ticket_search_insert AFTER INSERT ON app_ticket BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_update AFTER UPDATE OF title, description ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_delete AFTER DELETE ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_insert AFTER INSERT ON app_review BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_update AFTER UPDATE OF headline, body ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_delete AFTER DELETE ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS app_ticket_search_insert",
+    "DROP TRIGGER IF EXISTS app_ticket_search_update",
+    "DROP TRIGGER IF EXISTS app_ticket_search_delete",
+    "DROP TRIGGER IF EXISTS app_review_search_insert",
+    "DROP TRIGGER IF EXISTS app_review_search_update",
+    "DROP TRIGGER IF EXISTS app_review_search_delete",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is specific to sqlite
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_search_index'),
+    ]
+
+    operations = [
+        # adding the columns rebuilds both tables, which drops their search index triggers
+        migrations.RunPython(run(DROP_TRIGGERS), run(CREATE_TRIGGERS)),
+        migrations.AddField(
+            model_name='review',
+            name='is_deleted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='is_deleted',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(run(CREATE_TRIGGERS), run(DROP_TRIGGERS)),
+    ]
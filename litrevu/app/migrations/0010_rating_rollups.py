@@ -0,0 +1,64 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_audit_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewerRatingWeek',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField(help_text='Monday of the week')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('average', models.FloatField(default=0)),
+                ('rating_0', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TicketRatingWeek',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField(help_text='Monday of the week')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('average', models.FloatField(default=0)),
+                ('rating_0', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['week', '-average', '-review_count'], name='ticket_rating_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ticketratingweek',
+            constraint=models.UniqueConstraint(fields=('ticket', 'week'), name='unique_ticket_rating_week'),
+        ),
+        migrations.AddIndex(
+            model_name='reviewerratingweek',
+            index=models.Index(fields=['week', '-review_count', '-average'], name='reviewer_rating_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reviewerratingweek',
+            constraint=models.UniqueConstraint(fields=('user', 'week'), name='unique_reviewer_rating_week'),
+        ),
+    ]
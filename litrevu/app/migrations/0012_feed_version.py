@@ -0,0 +1,24 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:46
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_follow_suggestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_updated',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='feed_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
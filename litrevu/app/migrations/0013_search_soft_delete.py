@@ -0,0 +1,123 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:52
+
+from django.db import migrations
+
+# soft-deleted tickets and reviews leave the search index when they are flagged, like a hard delete
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER app_ticket_search_insert AFTER INSERT ON app_ticket WHEN NOT new.is_deleted BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_update AFTER UPDATE OF title, description, is_deleted ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+        INSERT INTO app_search_index (rowid, title, body)
+            SELECT new.id * 2, new.title, new.description WHERE NOT new.is_deleted;
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_delete AFTER DELETE ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_insert AFTER INSERT ON app_review WHEN NOT new.is_deleted BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_update AFTER UPDATE OF headline, body, is_deleted ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO app_search_index (rowid, title, body)
+            SELECT new.id * 2 + 1, new.headline, new.body WHERE NOT new.is_deleted;
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_delete AFTER DELETE ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+# the triggers of 0007_soft_delete
+PREVIOUS_TRIGGERS = [
+    """
+    CREATE TRIGGER app_ticket_search_insert AFTER INSERT ON app_ticket BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_update AFTER UPDATE OF title, description ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER app_ticket_search_delete AFTER DELETE ON app_ticket BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_insert AFTER INSERT ON app_review BEGIN
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_update AFTER UPDATE OF headline, body ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+        INSERT INTO app_search_index (rowid, title, body) VALUES (new.id * 2 + 1, new.headline, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER app_review_search_delete AFTER DELETE ON app_review BEGIN
+        DELETE FROM app_search_index WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS app_ticket_search_insert",
+    "DROP TRIGGER IF EXISTS app_ticket_search_update",
+    "DROP TRIGGER IF EXISTS app_ticket_search_delete",
+    "DROP TRIGGER IF EXISTS app_review_search_insert",
+    "DROP TRIGGER IF EXISTS app_review_search_update",
+    "DROP TRIGGER IF EXISTS app_review_search_delete",
+]
+
+# the rows flagged before these triggers existed
+DELETE_FLAGGED = [
+    "DELETE FROM app_search_index WHERE rowid IN (SELECT id * 2 FROM app_ticket WHERE is_deleted)",
+    "DELETE FROM app_search_index WHERE rowid IN (SELECT id * 2 + 1 FROM app_review WHERE is_deleted)",
+]
+
+RESTORE_FLAGGED = [
+    "INSERT INTO app_search_index (rowid, title, body) SELECT id * 2, title, description FROM app_ticket "
+    "WHERE is_deleted",
+    "INSERT INTO app_search_index (rowid, title, body) SELECT id * 2 + 1, headline, body FROM app_review "
+    "WHERE is_deleted",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is specific to sqlite
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_feed_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run(DROP_TRIGGERS + CREATE_TRIGGERS + DELETE_FLAGGED),
+            run(DROP_TRIGGERS + PREVIOUS_TRIGGERS + RESTORE_FLAGGED),
+        ),
+    ]
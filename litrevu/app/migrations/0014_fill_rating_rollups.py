@@ -0,0 +1,47 @@
+# Generated by Django 4.2.4 on 2026-10-18 11:58
+
+from django.db import migrations
+from django.db.models import Count, DateTimeField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def fill(model, key, Review):
+    """The rebuild of app.rollups, with the historical models, one bucket per key and week."""
+    model.objects.all().delete()
+    totals = Review.objects.filter(is_deleted=False)\
+        .values(key, 'rating', week=Trunc('time_created', 'week', output_field=DateTimeField()))\
+        .annotate(count=Count('id')).order_by(key, 'week')
+    buckets = {}
+    for total in totals.iterator(chunk_size=BATCH_SIZE):
+        week = timezone.localtime(total['week']).date()
+        if len(buckets) >= BATCH_SIZE and (total[key], week) not in buckets:
+            model.objects.bulk_create(buckets.values())
+            buckets = {}
+        bucket = buckets.setdefault((total[key], week), model(**{f'{key}_id': total[key]}, week=week))
+        rating, count = total['rating'], total['count']
+        setattr(bucket, f'rating_{rating}', getattr(bucket, f'rating_{rating}') + count)
+        bucket.review_count += count
+        bucket.rating_sum += rating * count
+        bucket.average = bucket.rating_sum / bucket.review_count
+    model.objects.bulk_create(buckets.values())
+
+
+def fill_rollups(apps, schema_editor):
+    Review = apps.get_model('app', 'Review')
+    fill(apps.get_model('app', 'TicketRatingWeek'), 'ticket', Review)
+    fill(apps.get_model('app', 'ReviewerRatingWeek'), 'user', Review)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_search_soft_delete'),
+    ]
+
+    operations = [
+        # the reviews posted before 0010_rating_rollups were never counted
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.4 on 2026-10-18 12:40
+
+from collections import defaultdict
+from itertools import islice
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def entries(TimelineEntry, Ticket, Review, followers):
+    """The fan-out of app.timeline for every ticket and review, read one pass over each table."""
+    tickets = Ticket.objects.filter(is_deleted=False).values_list('id', 'user_id', 'time_created')
+    for ticket_id, user_id, time_created in tickets.iterator(chunk_size=BATCH_SIZE):
+        for recipient in {user_id} | followers[user_id]:
+            yield TimelineEntry(user_id=recipient, ticket_id=ticket_id, time_created=time_created)
+    reviews = Review.objects.filter(is_deleted=False, ticket__is_deleted=False)\
+        .values_list('id', 'user_id', 'ticket__user_id', 'time_created')
+    for review_id, user_id, ticket_user_id, time_created in reviews.iterator(chunk_size=BATCH_SIZE):
+        for recipient in {user_id, ticket_user_id} | followers[user_id]:
+            yield TimelineEntry(user_id=recipient, review_id=review_id, time_created=time_created)
+
+
+def fill_timelines(apps, schema_editor):
+    TimelineEntry = apps.get_model('app', 'TimelineEntry')
+    followers = defaultdict(set)
+    follows = apps.get_model('app', 'UserFollows').objects.values_list('user_id', 'followed_user_id')
+    for user_id, followed_user_id in follows.iterator(chunk_size=BATCH_SIZE):
+        followers[followed_user_id].add(user_id)
+    rows = entries(TimelineEntry, apps.get_model('app', 'Ticket'), apps.get_model('app', 'Review'), followers)
+    while batch := list(islice(rows, BATCH_SIZE)):
+        # the entries written since 0002_timelineentry, or by rebuild_timelines, are kept
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_fill_rating_rollups'),
+    ]
+
+    operations = [
+        # the tickets and reviews posted before 0002_timelineentry were never fanned out
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
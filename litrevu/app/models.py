@@ -1,22 +1,111 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.dispatch import Signal
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
 
 
-class User(AbstractUser, PermissionsMixin):
-    pass
+class CountersMixin:
+    """
+    Leaves the counter_fields out of the UPDATE of a regular save.
 
+    Counters are only written with database-side increments by app.counters, a full save of an
+    instance loaded before an increment would otherwise put the old value back.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+# sent with the primary keys of the rows a soft_delete() call flagged, the receivers do what the
+# post_delete receivers do for a hard delete
+soft_deleted = Signal()
+SOFT_DELETE_CHUNK = 500
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    def soft_delete(self):
+        """
+        Flag the rows as deleted with set-based updates and return how many were flagged.
+
+        The rows stay in the table until the purge_deleted command removes them, the regular
+        `objects` manager doesn't return them any more.
+        """
+        with transaction.atomic():
+            pks = list(self.filter(is_deleted=False).values_list('pk', flat=True))
+            for start in range(0, len(pks), SOFT_DELETE_CHUNK):
+                self.model.all_objects.filter(pk__in=pks[start:start + SOFT_DELETE_CHUNK]).update(is_deleted=True)
+            if pks:
+                soft_deleted.send(sender=self.model, pks=pks)
+        return len(pks)
+
+
+class SoftDeleteManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class User(CountersMixin, AbstractUser, PermissionsMixin):
+    counter_fields = ('followers_count', 'following_count', 'feed_version', 'feed_updated')
+
+    # maintained by app.counters whenever a UserFollows row is added or removed
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    # moved by app.timeline.touch whenever something shown by the feed or the posts of the user changes,
+    # the validators of the JSON API responses
+    feed_version = models.PositiveIntegerField(default=0, editable=False)
+    feed_updated = models.DateTimeField(default=timezone.now, editable=False)
+
+
+class Ticket(CountersMixin, models.Model):
+    content_type = 'TICKET'
+    counter_fields = ('review_count', 'rating_sum')
 
-class Ticket(models.Model):
     title = models.CharField(max_length=128)
     description = models.TextField(max_length=2048, blank=True)
     user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     image = models.ImageField(null=True, blank=True)
-    time_created = models.DateTimeField(auto_now_add=True)
+    # not auto_now_add so that bulk loaders can keep the original dates
+    time_created = models.DateTimeField(default=timezone.now, editable=False)
+    # part of the cache key of the rendered feed cards
+    time_updated = models.DateTimeField(auto_now=True)
+    # maintained by app.counters whenever a Review of the ticket is added, rated again or removed
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    is_deleted = models.BooleanField(default=False, editable=False)
+
+    objects = SoftDeleteManager()
+    # includes the soft-deleted tickets, for the purge and the file reference checks
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the pages of a user's tickets, newest first
+            models.Index(fields=['user', '-time_created', '-id'], name='ticket_user_time_idx'),
+            # the checks for other tickets still showing an uploaded file before it is deleted
+            models.Index(fields=['image'], name='ticket_image_idx'),
+        ]
+
+    @property
+    def rating_average(self):
+        return self.rating_sum / self.review_count if self.review_count else None
+
+    @property
+    def card_version(self):
+        # the ticket card shows its review count, its average rating and the name of its author
+        return f'{self.time_updated.timestamp()}:{self.review_count}:{self.rating_sum}:{self.user.username}'
 
 
 class Review(models.Model):
+    content_type = 'REVIEW'
+
     ticket = models.ForeignKey(to=Ticket, on_delete=models.CASCADE)
     rating = models.PositiveSmallIntegerField(
         # validates that rating must be between 0 and 5
@@ -25,7 +114,70 @@ class Review(models.Model):
     body = models.CharField(max_length=8192, blank=True)
     user = models.ForeignKey(
         to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    time_created = models.DateTimeField(auto_now_add=True)
+    time_created = models.DateTimeField(default=timezone.now, editable=False)
+    time_updated = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False, editable=False)
+
+    objects = SoftDeleteManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-time_created', '-id'], name='review_user_time_idx'),
+        ]
+
+    @property
+    def card_version(self):
+        # the review card also shows the name of its author and its ticket
+        return f'{self.time_updated.timestamp()}:{self.user.username}:{self.ticket.card_version}'
+
+
+class RatingWeek(models.Model):
+    """Reviews posted in a week, counted per rating, maintained by app.rollups."""
+    week = models.DateField(help_text="Monday of the week")
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average = models.FloatField(default=0)
+    rating_0 = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def histogram(self):
+        return [getattr(self, f'rating_{rating}') for rating in range(6)]
+
+    def add(self, rating, count):
+        setattr(self, f'rating_{rating}', getattr(self, f'rating_{rating}') + count)
+        self.review_count += count
+        self.rating_sum += rating * count
+        self.average = self.rating_sum / self.review_count if self.review_count else 0
+
+
+class TicketRatingWeek(RatingWeek):
+    ticket = models.ForeignKey(to=Ticket, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['ticket', 'week'], name='unique_ticket_rating_week')]
+        indexes = [
+            # the best rated tickets of a week, read from the top of the index
+            models.Index(fields=['week', '-average', '-review_count'], name='ticket_rating_top_idx'),
+        ]
+
+
+class ReviewerRatingWeek(RatingWeek):
+    user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'week'], name='unique_reviewer_rating_week')]
+        indexes = [
+            models.Index(fields=['week', '-review_count', '-average'], name='reviewer_rating_top_idx'),
+        ]
 
 
 class UserFollows(models.Model):
@@ -38,3 +190,47 @@ class UserFollows(models.Model):
         # ensures we don't get multiple UserFollows instances
         # for unique user-user_followed pairs
         unique_together = ('user', 'followed_user', )
+        indexes = [
+            # the followers of a user, read from the index alone when fanning out a new post
+            models.Index(fields=['followed_user', 'user'], name='follows_followed_user_idx'),
+        ]
+
+
+class FollowSuggestion(models.Model):
+    # written by the suggest_follows command, rank 0 is the best suggestion
+    user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    suggested_user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    # users followed by the user who follow the suggested user, and tickets both of them reviewed
+    mutual_follows = models.PositiveIntegerField(default=0)
+    co_reviews = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'rank'], name='unique_follow_suggestion_rank')]
+
+
+class TimelineEntry(models.Model):
+    # one row per ticket or review that shows up in a user's feed, written when the item is posted
+    # (fan-out on write) so the feed is read with a single range scan on the index below
+    user = models.ForeignKey(to=settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline")
+    ticket = models.ForeignKey(to=Ticket, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    review = models.ForeignKey(to=Review, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    time_created = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-time_created', '-id'], name='timeline_user_time_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ticket'], condition=models.Q(review__isnull=True), name='unique_timeline_ticket'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'review'], condition=models.Q(ticket__isnull=True), name='unique_timeline_review'
+            ),
+        ]
+
+    @property
+    def content_type(self):
+        return 'REVIEW' if self.review_id else 'TICKET'
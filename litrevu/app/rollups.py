@@ -0,0 +1,154 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DateTimeField, F, FloatField, Sum
+from django.db.models.functions import Cast, Greatest, Trunc
+from django.utils import timezone
+from .models import Ticket, Review, User, TicketRatingWeek, ReviewerRatingWeek
+
+REBUILD_BATCH_SIZE = 1000
+LEADERBOARD_SIZE = 10
+# rollup model and the Review field it is keyed by
+BUCKETS = ((TicketRatingWeek, 'ticket'), (ReviewerRatingWeek, 'user'))
+
+
+def week_of(time):
+    """Monday of the week of time, in the current time zone like the Trunc of a rebuild."""
+    date = timezone.localtime(time).date()
+    return date - timedelta(days=date.weekday())
+
+
+def change_bucket(model, key, owner_id, week, deltas):
+    """
+    Add deltas[rating] reviews of each rating to the week bucket of a ticket or a user, negative counts remove
+    them. Returns False when the bucket holds fewer reviews of a rating than are removed, it is recomputed
+    from the reviews instead: a bucket filled after some of its reviews were posted doesn't count them.
+    """
+    count = sum(deltas.values())
+    total = sum(int(rating) * delta for rating, delta in deltas.items())
+    changes = {f'rating_{rating}': F(f'rating_{rating}') + delta for rating, delta in deltas.items()}
+    changes.update(
+        review_count=F('review_count') + count,
+        rating_sum=F('rating_sum') + total,
+        # computed from the values before the update, like the other assignments of the statement
+        average=Cast(F('rating_sum') + total, FloatField()) / Greatest(F('review_count') + count, 1),
+    )
+    bucket = model.objects.filter(**{f'{key}_id': owner_id}, week=week)
+    removed = {f'rating_{rating}__gte': -delta for rating, delta in deltas.items() if delta < 0}
+    if removed:
+        if not bucket.filter(**removed).update(**changes):
+            rebuild_week(model, key, owner_id, week)
+            return False
+    elif not bucket.update(**changes):
+        # first review of the week, a concurrent request may create the row first
+        model.objects.bulk_create([model(**{f'{key}_id': owner_id}, week=week)], ignore_conflicts=True)
+        bucket.update(**changes)
+    return True
+
+
+def change(review, deltas):
+    week = week_of(review.time_created)
+    for model, key in BUCKETS:
+        change_bucket(model, key, getattr(review, f'{key}_id'), week, deltas)
+
+
+def review_added(review):
+    change(review, {int(review.rating): 1})
+
+
+def review_removed(review, rating=None):
+    rating = review.rating if rating is None else rating
+    change(review, {int(rating): -1})
+
+
+def rating_changed(review, previous_rating):
+    # one update, a bucket recomputed because it missed the previous rating already counts the new one
+    deltas = Counter({int(previous_rating): -1})
+    deltas[int(review.rating)] += 1
+    change(review, deltas)
+
+
+def reviews_removed(review_ids):
+    """Take a set of reviews out of the buckets, with one update per bucket."""
+    reviews = list(Review.all_objects.filter(pk__in=review_ids)
+                   .values_list('ticket_id', 'user_id', 'time_created', 'rating'))
+    for model, key in BUCKETS:
+        buckets = defaultdict(Counter)
+        for ticket_id, user_id, time_created, rating in reviews:
+            owner_id = ticket_id if key == 'ticket' else user_id
+            buckets[owner_id, week_of(time_created)][rating] -= 1
+        for (owner_id, week), deltas in buckets.items():
+            change_bucket(model, key, owner_id, week, deltas)
+
+
+def rebuild_week(model, key, owner_id, week):
+    """Recompute the bucket of a ticket or a user for one week from the Review table."""
+    start = timezone.make_aware(datetime.combine(week, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(week + timedelta(weeks=1), datetime.min.time()))
+    totals = Review.objects.filter(**{f'{key}_id': owner_id}, time_created__gte=start, time_created__lt=end)\
+        .order_by().values('rating').annotate(count=Count('id'))
+    bucket = model(**{f'{key}_id': owner_id}, week=week)
+    for total in totals:
+        bucket.add(total['rating'], total['count'])
+    with transaction.atomic():
+        model.objects.filter(**{f'{key}_id': owner_id}, week=week).delete()
+        if bucket.review_count:
+            bucket.save()
+
+
+def rebuild(model, key, queryset, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute the buckets of the tickets or users of queryset from the Review table, one transaction per
+    batch_size of them. The buckets left empty by deletes are not written again.
+    """
+    written = 0
+    last_pk = 0
+    while pks := list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]):
+        with transaction.atomic():
+            totals = Review.objects.filter(**{f'{key}_id__in': pks}).order_by()\
+                .values(key, 'rating', week=Trunc('time_created', 'week', output_field=DateTimeField()))\
+                .annotate(count=Count('id'))
+            buckets = {}
+            for total in totals:
+                week = timezone.localtime(total['week']).date()
+                bucket = buckets.setdefault((total[key], week), model(**{f'{key}_id': total[key]}, week=week))
+                bucket.add(total['rating'], total['count'])
+            model.objects.filter(**{f'{key}_id__in': pks}).delete()
+            model.objects.bulk_create(buckets.values(), batch_size=batch_size)
+        written += len(buckets)
+        last_pk = pks[-1]
+    return written
+
+
+def rebuild_tickets(batch_size=REBUILD_BATCH_SIZE, queryset=None):
+    queryset = Ticket.all_objects.all() if queryset is None else queryset
+    return rebuild(TicketRatingWeek, 'ticket', queryset, batch_size)
+
+
+def rebuild_users(batch_size=REBUILD_BATCH_SIZE, queryset=None):
+    queryset = User.objects.all() if queryset is None else queryset
+    return rebuild(ReviewerRatingWeek, 'user', queryset, batch_size)
+
+
+def compact():
+    """Delete the buckets whose reviews were all deleted, returns how many were."""
+    return sum(model.objects.filter(review_count=0).delete()[0] for model, _ in BUCKETS)
+
+
+def top_tickets(week, limit=LEADERBOARD_SIZE):
+    return TicketRatingWeek.objects.filter(week=week, review_count__gt=0)\
+        .select_related('ticket__user').order_by('-average', '-review_count')[:limit]
+
+
+def top_reviewers(week, limit=LEADERBOARD_SIZE):
+    return ReviewerRatingWeek.objects.filter(week=week, review_count__gt=0)\
+        .select_related('user').order_by('-review_count', '-average')[:limit]
+
+
+def reviewer_totals(user_id):
+    """Review count and average rating of a user over every week, summed from their buckets."""
+    totals = ReviewerRatingWeek.objects.filter(user_id=user_id)\
+        .aggregate(review_count=Sum('review_count'), rating_sum=Sum('rating_sum'))
+    review_count = totals['review_count'] or 0
+    return review_count, (totals['rating_sum'] / review_count if review_count else None)
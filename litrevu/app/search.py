@@ -0,0 +1,93 @@
+import re
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .feeds import load_items
+
+SEARCH_PAGE_SIZE = 20
+REBUILD_BATCH_SIZE = 1000
+MATCHING_IDS_LIMIT = 1000
+# a title match weighs ten times a body match
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+# control characters can't come from a form, they mark the matches in snippets until the text is escaped
+MATCH_START, MATCH_END = '\x02', '\x03'
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query matching every word, the last one as a prefix for search-as-you-type."""
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return None
+    return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+def search(query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Return the tickets and reviews matching query for a page of results, best match first, along with
+    whether a next page exists. Each item gets a `snippet` of its matching text with the terms highlighted.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return [], False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, snippet(app_search_index, -1, %s, %s, '…', 16) FROM app_search_index "
+            "WHERE app_search_index MATCH %s ORDER BY bm25(app_search_index, %s, %s) LIMIT %s OFFSET %s",
+            [MATCH_START, MATCH_END, expression, TITLE_WEIGHT, BODY_WEIGHT, page_size + 1, (page - 1) * page_size],
+        )
+        rows = cursor.fetchall()
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    # rowids are 2 * id for tickets and 2 * id + 1 for reviews, see the 0006_search_index migration
+    keys = [(rowid // 2, None, 'REVIEW' if rowid % 2 else 'TICKET') for rowid, _ in rows]
+    snippets = {key: snippet for key, (_, snippet) in zip(keys, rows)}
+    items = load_items(keys)
+    for item in items:
+        item.snippet = highlight(snippets[(item.pk, None, item.content_type)])
+    return items, has_next
+
+
+def matching_ids(query, content_type, limit=MATCHING_IDS_LIMIT):
+    """Return the ids of up to limit tickets or reviews (content_type 'TICKET' or 'REVIEW') matching query."""
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid FROM app_search_index WHERE app_search_index MATCH %s AND rowid %% 2 = %s "
+            "ORDER BY bm25(app_search_index, %s, %s) LIMIT %s",
+            [expression, int(content_type == 'REVIEW'), TITLE_WEIGHT, BODY_WEIGHT, limit],
+        )
+        return [rowid // 2 for rowid, in cursor.fetchall()]
+
+
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Refill the search index from the tickets and reviews that aren't deleted, one transaction per batch_size ids.
+    """
+    sources = [
+        ('app_ticket', "SELECT id * 2, title, description FROM app_ticket "
+                       "WHERE id > %s AND id <= %s AND NOT is_deleted"),
+        ('app_review', "SELECT id * 2 + 1, headline, body FROM app_review "
+                       "WHERE id > %s AND id <= %s AND NOT is_deleted"),
+    ]
+    with connection.cursor() as cursor:
+        with transaction.atomic():
+            cursor.execute("DELETE FROM app_search_index")
+        for table, select in sources:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            last_id = cursor.fetchone()[0]
+            for start in range(0, last_id, batch_size):
+                with transaction.atomic():
+                    cursor.execute(f"INSERT INTO app_search_index (rowid, title, body) {select}",
+                                   [start, start + batch_size])
+        cursor.execute("INSERT INTO app_search_index (app_search_index) VALUES ('optimize')")
+        cursor.execute("SELECT COUNT(*) FROM app_search_index")
+        return cursor.fetchone()[0]
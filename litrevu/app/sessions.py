@@ -0,0 +1,34 @@
+from django.contrib.sessions.backends import cached_db
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from .middleware import cache_stats
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    cached_db session store counting its cache hits, writes still go to the cache and the database.
+
+    Like CachedModelBackend it needs a cache shared by every process: with a per-process locmem cache,
+    a session flushed at logout by one worker would still be served by the others.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if isinstance(self._cache, LocMemCache):
+            raise ImproperlyConfigured("app.sessions needs a cache shared by every process, not LocMemCache")
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            # some backends (e.g. memcache) raise an exception on invalid cache keys
+            data = None
+        cache_stats.record('session', hit=data is not None)
+        if data is None:
+            session = self._get_session_from_db()
+            if session:
+                data = self.decode(session.session_data)
+                self._cache.set(self.cache_key, data, self.get_expiry_age(expiry=session.expire_date))
+            else:
+                data = {}
+        return data
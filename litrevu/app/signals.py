@@ -0,0 +1,154 @@
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from .middleware import record_query
+from .models import Ticket, Review, User, UserFollows, soft_deleted
+from .usernames import username_index
+from . import backends, cards, counters, database, images, live, rollups, timeline
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_created(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_ticket(instance)
+        transaction.on_commit(partial(live.publish_item, instance))
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_changed(sender, instance, **kwargs):
+    # registered after ticket_created, a new ticket is in the timelines by now
+    timeline.touch_items(ticket_ids=[instance.pk])
+
+
+@receiver(pre_save, sender=Ticket)
+def ticket_uploading(sender, instance, **kwargs):
+    # the file of a new upload is only written to the storage while the ticket is saved
+    instance.image_uploaded = bool(instance.image) and not instance.image._committed
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, **kwargs):
+    # renditions are generated once per upload, TicketUpdateView drops them when the image is replaced
+    if instance.image_uploaded and not images.has_renditions(instance.image.name):
+        images.generate_renditions(instance.image.name)
+
+
+@receiver(post_init, sender=Review)
+def review_loaded(sender, instance, **kwargs):
+    # remembers the stored rating so an update knows by how much the ticket's rating sum moves,
+    # read from __dict__ so a deferred rating isn't fetched
+    instance.stored_rating = instance.__dict__.get('rating')
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    rerated = not created and instance.stored_rating is not None \
+        and int(instance.rating) != int(instance.stored_rating)
+    if created:
+        timeline.fan_out_review(instance)
+        counters.review_added(instance)
+        rollups.review_added(instance)
+        transaction.on_commit(partial(live.publish_item, instance))
+    elif rerated:
+        counters.rating_changed(instance, instance.stored_rating)
+        rollups.rating_changed(instance, instance.stored_rating)
+    # the counters of the ticket moved with a new rating, every card of the ticket shows them
+    timeline.touch_items(ticket_ids=[instance.ticket_id] if created or rerated else [], review_ids=[instance.pk])
+    instance.stored_rating = instance.rating
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    # a soft-deleted review already left the counters and the rollups
+    if not instance.is_deleted:
+        counters.review_removed(instance, instance.stored_rating)
+        rollups.review_removed(instance, instance.stored_rating)
+
+
+@receiver(post_save, sender=UserFollows)
+def user_followed(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, [instance.followed_user_id])
+        counters.follow_added(instance)
+
+
+@receiver(post_delete, sender=UserFollows)
+def user_unfollowed(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.followed_user_id)
+    counters.follow_removed(instance)
+
+
+@receiver(pre_delete, sender=Ticket)
+def ticket_deleting(sender, instance, **kwargs):
+    # the timeline entries go with the ticket, the users showing it are found first
+    if not instance.is_deleted:
+        timeline.touch_items(ticket_ids=[instance.pk])
+
+
+@receiver(pre_delete, sender=Review)
+def review_deleting(sender, instance, **kwargs):
+    if not instance.is_deleted:
+        timeline.touch_items(ticket_ids=[instance.ticket_id])
+
+
+@receiver(post_delete, sender=Ticket)
+@receiver(post_delete, sender=Review)
+def item_deleted(sender, instance, **kwargs):
+    # the cards of a soft-deleted item were evicted when it was flagged
+    if not instance.is_deleted:
+        cards.evict_cards(instance)
+
+
+@receiver(soft_deleted, sender=Ticket)
+def tickets_soft_deleted(sender, pks, **kwargs):
+    for ticket in Ticket.all_objects.filter(pk__in=pks).select_related('user'):
+        cards.evict_cards(ticket)
+    # the reviews go with their ticket, like the cascade of a hard delete
+    Review.objects.filter(ticket_id__in=pks).soft_delete()
+    # the timelines of the followers are cleaned up once the flags are committed, the write transaction
+    # of the request only flags the rows
+    transaction.on_commit(partial(timeline.remove_tickets, pks))
+
+
+@receiver(soft_deleted, sender=Review)
+def reviews_soft_deleted(sender, pks, **kwargs):
+    # evicted first, the card version of a review includes the counters of its ticket
+    for review in Review.all_objects.filter(pk__in=pks).select_related('user', 'ticket__user'):
+        cards.evict_cards(review)
+    counters.reviews_removed(pks)
+    rollups.reviews_removed(pks)
+    ticket_ids = set(Review.all_objects.filter(pk__in=pks).values_list('ticket_id', flat=True))
+    transaction.on_commit(partial(timeline.remove_reviews, pks, ticket_ids))
+
+
+@receiver(post_save, sender=User)
+def user_signed_up(sender, instance, created, **kwargs):
+    if created and instance.is_active:
+        username_index.add(instance.username)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance.stored_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # the session's user may be cached by CachedModelBackend, a password change must not keep an old copy
+    if not created:
+        backends.forget_users([instance.pk])
+        # the cards show the names of the authors
+        if instance.stored_username is not None and instance.username != instance.stored_username:
+            timeline.touch_authors([instance.pk])
+    instance.stored_username = instance.username
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    database.apply_pragmas(connection)
+    # first in the list, execute_wrapper() blocks pop the last wrapper when they exit
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
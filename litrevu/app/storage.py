@@ -0,0 +1,43 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage keeping each upload under the sha256 of its content, e.g. `3f/3fa2...e1.jpg`.
+
+    The content is hashed while it is streamed to a temporary file, an upload identical to a stored file
+    reuses it instead of writing a copy. Stored files never change so they can be cached as immutable,
+    `cleanup_media` deletes the ones no ticket points to any more.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # the final name depends on the content, it is only known in _save
+        return name
+
+    def _save(self, name, content):
+        _, extension = posixpath.splitext(name)
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.location, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as temporary_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temporary_file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = f'{hexdigest[:2]}/{hexdigest}{extension.lower()}'
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary_path, self.file_permissions_mode)
+                os.replace(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+        return name
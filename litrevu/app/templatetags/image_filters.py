@@ -0,0 +1,12 @@
+from django import template
+from app.images import has_renditions, srcset as rendition_srcset
+
+register = template.Library()
+
+
+@register.filter(name='srcset')
+def srcset(image):
+    # an empty srcset makes the browser fall back on src, the original upload
+    if not image or not has_renditions(image.name):
+        return ''
+    return rendition_srcset(image.name)
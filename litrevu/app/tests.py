@@ -1,3 +1,741 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+from datetime import date
+from functools import wraps
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.apps import apps as django_apps
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .backends import CachedModelBackend
+from .feeds import merged_page, parse_cursor, timeline_page
+from .follow_graph import follow_many, unfollow_many
+from .forms import FollowUserForm
+from .images import RENDITION_WIDTHS, rendition_name, rendition_storage
+from .live import FeedHub, HubFull, RESET, feed_hub
+from .models import (User, Ticket, Review, UserFollows, TimelineEntry, TicketRatingWeek, ReviewerRatingWeek,
+                     FollowSuggestion)
+from . import database, rollups
+from .search import search, matching_ids
+from .sessions import SessionStore
+from .views import FollowView
+
+
+def query_budget(max_queries):
+    """
+    Fail the decorated test when it runs more than max_queries SQL queries.
+
+    Views are expected to stay under the same budget whatever the amount of data, so a lookup
+    done once per row shows up as soon as the test seeds more than a handful of rows.
+    """
+    def decorator(test):
+        @wraps(test)
+        def wrapper(self, *args, **kwargs):
+            with CaptureQueriesContext(connection) as context:
+                result = test(self, *args, **kwargs)
+            executed = len(context.captured_queries)
+            if executed > max_queries:
+                queries = '\n'.join(query['sql'] for query in context.captured_queries)
+                self.fail(f'{executed} queries executed, budget is {max_queries}:\n{queries}')
+            return result
+        return wrapper
+    return decorator
+
+
+class EmptyCacheTestCase(TestCase):
+    # the rendered cards are cached by item id, the ids are reused once a test rolls back
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class QueryBudgetTests(EmptyCacheTestCase):
+    # the budgets include the two queries of the database session store and ModelBackend loading the
+    # session and the user on every request, see SESSION_ENGINE and AUTHENTICATION_BACKENDS
+    ITEMS = 50
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='password')
+        authors = [User.objects.create_user(f'author{i}', password='password') for i in range(5)]
+        for author in authors:
+            UserFollows.objects.create(user=cls.user, followed_user=author)
+            UserFollows.objects.create(user=author, followed_user=cls.user)
+        for i in range(cls.ITEMS):
+            author = authors[i % len(authors)]
+            ticket = Ticket.objects.create(title=f'ticket {i}', user=author, image='cover.jpg')
+            Review.objects.create(ticket=ticket, user=cls.user, rating=i % 6, headline=f'review {i}')
+            own_ticket = Ticket.objects.create(title=f'own ticket {i}', user=cls.user)
+            Review.objects.create(ticket=own_ticket, user=author, rating=i % 6, headline=f'answer {i}')
+        suggested = User.objects.create_user('suggested')
+        gone = User.objects.create_user('gone', is_active=False)
+        FollowSuggestion.objects.create(user=cls.user, suggested_user=gone, rank=0, score=2, mutual_follows=2)
+        FollowSuggestion.objects.create(user=cls.user, suggested_user=suggested, rank=1, score=1, mutual_follows=1)
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    @query_budget(3)
+    def test_feeds(self):
+        response = self.client.get(reverse('feeds'))
+        self.assertEqual(len(response.context['feeds']), 20)
+
+    @query_budget(5)
+    def test_posts(self):
+        response = self.client.get(reverse('posts'))
+        self.assertEqual(len(response.context['posts']), 20)
+
+    @query_budget(5)
+    def test_follow(self):
+        response = self.client.get(reverse('user-follow'))
+        self.assertContains(response, 'author4', count=2)
+        self.assertEqual([s.suggested_user.username for s in response.context['suggestions']], ['suggested'])
+        self.assertContains(response, 'followed by 1 user you follow')
+        self.assertNotContains(response, 'gone')
+
+    @query_budget(3)
+    def test_ticket_list(self):
+        response = self.client.get(reverse('ticket-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['tickets']), 20)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    @query_budget(3)
+    def test_review_list(self):
+        response = self.client.get(reverse('review-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['reviews']), 20)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+    @query_budget(5)
+    def test_leaderboard(self):
+        response = self.client.get(reverse('leaderboard'))
+        self.assertEqual(len(response.context['top_reviewers']), 6)
+
+
+class CursorTests(EmptyCacheTestCase):
+
+    def test_invalid_cursor(self):
+        self.assertIsNone(parse_cursor('2023-13-45T00:00:00,5'))
+        self.assertIsNone(parse_cursor('2023-01-01T00:00:00,5,USER'))
+        self.assertIsNone(parse_cursor('abc'))
+        self.assertIsNone(parse_cursor('2023-01-01T00:00:00'))
+        user = User.objects.create_user('reader', password='password')
+        self.client.force_login(user)
+        for before in ['2023-13-45T00:00:00,5', 'abc', '2023-01-01T00:00:00']:
+            response = self.client.get(reverse('posts'), {'before': before})
+            self.assertEqual(response.status_code, 200)
+
+    def test_merged_page_ties(self):
+        # a ticket and a review with the same time and id, one page each
+        user = User.objects.create_user('reader', password='password')
+        now = timezone.now()
+        ticket = Ticket.objects.create(title='ticket', user=user, time_created=now)
+        review = Review.objects.create(ticket=ticket, user=user, rating=3, headline='review', time_created=now)
+        self.assertEqual(ticket.pk, review.pk)
+        reviews, tickets = Review.objects.filter(user=user), Ticket.objects.filter(user=user)
+        first, cursor = merged_page(reviews, tickets, page_size=1)
+        second, cursor = merged_page(reviews, tickets, cursor=parse_cursor(cursor), page_size=1)
+        self.assertEqual([first[0].content_type, second[0].content_type], ['TICKET', 'REVIEW'])
+        self.assertIsNone(cursor)
+
+
+class ListTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user('reader')
+        author = User.objects.create_user('author')
+        self.reviewed = Ticket.objects.create(title='reviewed', user=self.reader)
+        self.unreviewed = Ticket.objects.create(title='unreviewed', user=self.reader)
+        other = Ticket.objects.create(title='other', user=author)
+        Review.objects.create(ticket=self.reviewed, user=author, rating=3, headline='answer')
+        self.review = Review.objects.create(ticket=other, user=self.reader, rating=4, headline='review')
+        self.client.force_login(self.reader)
+
+    def test_ticket_list(self):
+        response = self.client.get(reverse('ticket-list'))
+        self.assertEqual(response.context['tickets'], [self.unreviewed, self.reviewed])
+        response = self.client.get(reverse('ticket-list'), {'unreviewed': ''})
+        self.assertEqual(response.context['tickets'], [self.unreviewed])
+
+    def test_review_list(self):
+        response = self.client.get(reverse('review-list'))
+        self.assertEqual(response.context['reviews'], [self.review])
+
+
+class TimelineTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user('reader')
+        self.author = User.objects.create_user('author')
+        UserFollows.objects.create(user=self.reader, followed_user=self.author)
+
+    def feed(self, user):
+        return timeline_page(user, page_size=100)[0]
+
+    def test_fan_out(self):
+        ticket = Ticket.objects.create(title='ticket', user=self.author)
+        review = Review.objects.create(ticket=ticket, user=self.author, rating=4, headline='review')
+        self.assertEqual(self.feed(self.reader), [review, ticket])
+        self.assertEqual(self.feed(self.author), [review, ticket])
+        self.assertEqual(self.feed(User.objects.create_user('stranger')), [])
+
+    def test_unfollow_and_follow_again(self):
+        own = Ticket.objects.create(title='own', user=self.reader)
+        answer = Review.objects.create(ticket=own, user=self.author, rating=2, headline='answer')
+        other = Ticket.objects.create(title='other', user=self.author)
+        UserFollows.objects.get(user=self.reader).delete()
+        # the reviews of the reader's own tickets stay
+        self.assertEqual(self.feed(self.reader), [answer, own])
+        UserFollows.objects.create(user=self.reader, followed_user=self.author)
+        self.assertEqual(self.feed(self.reader), [other, answer, own])
+
+    def test_soft_delete_cleans_up_after_commit(self):
+        ticket = Ticket.objects.create(title='ticket', user=self.author)
+        review = Review.objects.create(ticket=ticket, user=self.author, rating=4, headline='review')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.filter(pk=ticket.pk).soft_delete()
+            # the transaction flagging the rows doesn't write to the timelines of the followers
+            self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.feed(self.reader), [])
+        self.assertFalse(Review.objects.filter(pk=review.pk).exists())
+
+    def test_migration_fills_the_timelines(self):
+        own = Ticket.objects.create(title='own', user=self.reader)
+        answer = Review.objects.create(ticket=own, user=self.author, rating=2, headline='answer')
+        other = Ticket.objects.create(title='other', user=self.author)
+        Ticket.objects.filter(pk=Ticket.objects.create(title='deleted', user=self.author).pk).soft_delete()
+        TimelineEntry.objects.all().delete()
+        import_module('app.migrations.0015_fill_timelines').fill_timelines(django_apps, None)
+        self.assertEqual(self.feed(self.reader), [other, answer, own])
+        self.assertEqual(self.feed(self.author), [other, answer])
+
+
+class CounterTests(EmptyCacheTestCase):
+
+    def test_counters(self):
+        reader = User.objects.create_user('reader')
+        author = User.objects.create_user('author')
+        follow = UserFollows.objects.create(user=reader, followed_user=author)
+        ticket = Ticket.objects.create(title='ticket', user=author)
+        review = Review.objects.create(ticket=ticket, user=reader, rating=4, headline='review')
+        Review.objects.create(ticket=ticket, user=author, rating=2, headline='answer')
+        review.rating = 5
+        review.save()
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.review_count, ticket.rating_sum), (2, 7))
+        review.delete()
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.review_count, ticket.rating_sum), (1, 2))
+
+        reader.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual((reader.following_count, author.followers_count), (1, 1))
+        follow.delete()
+        reader.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual((reader.following_count, author.followers_count), (0, 0))
+
+
+class SearchTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+
+    def matches(self, query):
+        return {(item.content_type, item.pk) for item in search(query)[0]}
+
+    def test_index_follows_the_tables(self):
+        user = User.objects.create_user('reader')
+        ticket = Ticket.objects.create(title='Dune', description='a desert planet', user=user)
+        review = Review.objects.create(ticket=ticket, user=user, rating=5, headline='Great', body='deserted')
+        self.assertEqual(self.matches('desert'), {('TICKET', ticket.pk), ('REVIEW', review.pk)})
+        ticket.description = 'spice'
+        ticket.save()
+        self.assertEqual(self.matches('desert'), {('REVIEW', review.pk)})
+        self.assertEqual(self.matches('dune spi'), {('TICKET', ticket.pk)})
+        review.delete()
+        self.assertEqual(self.matches('desert'), set())
+
+    def test_soft_deleted_rows_leave_the_index(self):
+        user = User.objects.create_user('reader')
+        tickets = [Ticket.objects.create(title=f'Dune {i}', user=user) for i in range(3)]
+        Review.objects.create(ticket=tickets[0], user=user, rating=5, headline='Dune review')
+        Ticket.objects.filter(pk=tickets[0].pk).soft_delete()
+        self.assertEqual(self.matches('dune'), {('TICKET', tickets[1].pk), ('TICKET', tickets[2].pk)})
+        results, has_next = search('dune', page_size=2)
+        self.assertEqual((len(results), has_next), (2, False))
+        self.assertEqual(matching_ids('dune', 'REVIEW'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.matches('dune')), 2)
+
+
+class CardTests(EmptyCacheTestCase):
+
+    def test_cards_follow_their_author_and_ticket(self):
+        reader = User.objects.create_user('reader')
+        author = User.objects.create_user('author')
+        UserFollows.objects.create(user=reader, followed_user=author)
+        ticket = Ticket.objects.create(title='Dune', user=author)
+        Review.objects.create(ticket=ticket, user=reader, rating=4, headline='review')
+        self.client.force_login(reader)
+        response = self.client.get(reverse('feeds'))
+        self.assertContains(response, 'Ticket from: author')
+        self.assertContains(response, 'Ticket from author')
+
+        author.username = 'writer'
+        author.save()
+        response = self.client.get(reverse('feeds'))
+        self.assertNotContains(response, 'author')
+        self.assertContains(response, 'writer', count=2)
+
+        ticket.refresh_from_db()
+        ticket.title = 'Dune Messiah'
+        ticket.save()
+        response = self.client.get(reverse('feeds'))
+        self.assertContains(response, 'Title: Dune Messiah', count=2)
+
+
+class SuggestionTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader, self.friend, self.mutual, self.reviewer, self.gone = (
+            User.objects.create_user(name) for name in ['reader', 'friend', 'mutual', 'reviewer', 'gone'])
+        self.gone.is_active = False
+        self.gone.save()
+        for user, followed_user in [(self.reader, self.friend), (self.friend, self.mutual),
+                                    (self.friend, self.gone), (self.friend, self.reader)]:
+            UserFollows.objects.create(user=user, followed_user=followed_user)
+        ticket = Ticket.objects.create(title='ticket', user=self.friend)
+        for user in [self.reader, self.reviewer, self.gone]:
+            Review.objects.create(ticket=ticket, user=user, rating=3, headline='review')
+
+    def suggestions(self, user):
+        return list(FollowSuggestion.objects.filter(user=user).order_by('rank')
+                    .values_list('suggested_user__username', 'mutual_follows', 'co_reviews'))
+
+    def test_ranking_and_exclusions(self):
+        call_command('suggest_follows', stdout=StringIO())
+        # a mutual follow outranks a shared review, the followed, inactive and the reader themselves are left out
+        self.assertEqual(self.suggestions(self.reader), [('mutual', 1, 0), ('reviewer', 0, 1)])
+
+    def test_inactive_users_are_cleared(self):
+        FollowSuggestion.objects.create(user=self.gone, suggested_user=self.reader, rank=0, score=1)
+        FollowSuggestion.objects.create(user=self.reviewer, suggested_user=self.gone, rank=0, score=1)
+        self.reviewer.is_active = False
+        self.reviewer.save()
+        call_command('suggest_follows', stdout=StringIO())
+        self.assertEqual(self.suggestions(self.gone), [])
+        self.assertEqual(self.suggestions(self.reviewer), [])
+        self.assertEqual(self.suggestions(self.reader), [('mutual', 1, 0)])
+
+
+class FollowGraphTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user('reader')
+        self.author = User.objects.create_user('author')
+        # like a follow made by another process, no signal reaches this one
+        UserFollows.objects.bulk_create([UserFollows(user=self.reader, followed_user=self.author)])
+
+    def test_follow_form_reads_the_table(self):
+        self.client.force_login(self.reader)
+        response = self.client.post(reverse('user-follow'), {'follow_username': 'author'})
+        self.assertFormError(response.context['form'], 'follow_username', 'user already followed')
+
+    def test_follow_form_takes_one_query(self):
+        other = User.objects.create_user('other')
+        form = FollowUserForm({'follow_username': 'other'}, user=self.reader)
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.followed_user, other)
+        # followed by a concurrent submission once the form is validated
+        UserFollows.objects.bulk_create([UserFollows(user=self.reader, followed_user=other)])
+        view = FollowView()
+        view.setup(RequestFactory().post(reverse('user-follow')))
+        view.request.user = self.reader
+        with transaction.atomic():
+            response = view.form_valid(form)
+        self.assertEqual(response.status_code, 302)
+
+    def test_follow_many_reads_the_table(self):
+        other = User.objects.create_user('other')
+        self.assertEqual(follow_many(self.reader, [self.author.pk, other.pk, self.reader.pk]), {other.pk})
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.following_count, 2)
+
+    def test_unfollow_many_writes_first(self):
+        other = User.objects.create_user('other')
+        UserFollows.objects.create(user=other, followed_user=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unfollow_many(other, [self.author.pk, self.reader.pk]), {self.author.pk})
+        statements = [query['sql'] for query in queries.captured_queries]
+        # the rows are read once before the transaction, which starts with the delete: a transaction that has
+        # read can't take the write lock while another connection writes
+        self.assertEqual([sql.split()[0] for sql in statements[:2]], ['SELECT', 'DELETE'])
+        other.refresh_from_db()
+        self.assertEqual(other.following_count, 0)
+
+    def test_fan_out_reads_the_table(self):
+        ticket = Ticket.objects.create(title='ticket', user=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader, ticket=ticket).exists())
+
+
+class MediaTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.author = User.objects.create_user('author')
+
+    def upload(self, name, color):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 600), color).save(buffer, format='PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def renditions(self, name):
+        widths = []
+        for width in RENDITION_WIDTHS:
+            if rendition_storage.exists(rendition_name(name, width)):
+                with rendition_storage.open(rendition_name(name, width)) as file:
+                    widths.append(Image.open(file).width)
+        return widths
+
+    def test_identical_uploads_are_stored_once(self):
+        first = Ticket.objects.create(title='first', user=self.author, image=self.upload('cover.PNG', 'red'))
+        second = Ticket.objects.create(title='second', user=self.author, image=self.upload('other.png', 'red'))
+        self.assertEqual(first.image.name, second.image.name)
+        digest = hashlib.sha256(self.upload('cover.png', 'red').read()).hexdigest()
+        self.assertEqual(first.image.name, f'{digest[:2]}/{digest}.png')
+        self.assertEqual(default_storage.listdir(digest[:2]), ([], [f'{digest}.png']))
+        self.assertEqual(self.renditions(first.image.name), [320, 640, 960])
+
+    def test_renditions_follow_the_image(self):
+        ticket = Ticket.objects.create(title='ticket', user=self.author, image=self.upload('cover.png', 'red'))
+        shared = Ticket.objects.create(title='shared', user=self.author, image=self.upload('cover.png', 'blue'))
+        self.client.force_login(self.author)
+        for updated, color, previous_renditions in [(ticket, 'blue', []), (shared, 'green', [320, 640, 960])]:
+            previous = updated.image.name
+            response = self.client.post(reverse('ticket-update', args=[updated.pk]), {
+                'title': updated.title, 'description': '', 'image': self.upload('new.png', color),
+            })
+            self.assertEqual(response.status_code, 302)
+            updated.refresh_from_db()
+            self.assertEqual(self.renditions(updated.image.name), [320, 640, 960])
+            # the renditions of the previous image stay while another ticket shows it
+            self.assertEqual(self.renditions(previous), previous_renditions)
+
+
+class LiveFeedTests(EmptyCacheTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader')
+
+    async def test_subscriber_cap(self):
+        hub = FeedHub(max_subscribers=1)
+        subscription = hub.subscribe(self.reader.pk)
+        with self.assertRaises(HubFull):
+            hub.subscribe(self.reader.pk)
+        hub.unsubscribe(subscription)
+        hub.subscribe(self.reader.pk)
+
+    async def test_overflow_resets_the_subscriber(self):
+        hub = FeedHub(queue_size=2)
+        subscription = hub.subscribe(self.reader.pk)
+        for i in range(4):
+            hub.publish([self.reader.pk], {'event': 'item', 'id': i})
+        # delivered by the loop of the subscriber
+        await asyncio.sleep(0)
+        self.assertIs(await subscription.get(timeout=1), RESET)
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+    async def test_full_hub_answers_503(self):
+        await sync_to_async(self.async_client.force_login)(self.reader)
+        with mock.patch.object(feed_hub, 'max_subscribers', 0):
+            response = await self.async_client.get(reverse('feed-live'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_live_script_only_under_asgi(self):
+        self.client.force_login(self.reader)
+        self.assertNotContains(self.client.get(reverse('feeds')), 'EventSource')
+        self.async_client.force_login(self.reader)
+        response = async_to_sync(self.async_client.get)(reverse('feeds'))
+        self.assertContains(response, 'EventSource')
+
+
+class ConditionalApiTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user('reader')
+        self.author = User.objects.create_user('author')
+        UserFollows.objects.create(user=self.reader, followed_user=self.author)
+        self.ticket = Ticket.objects.create(title='Dune', user=self.author)
+        self.review = Review.objects.create(ticket=self.ticket, user=self.reader, rating=3, headline='review')
+        self.client.force_login(self.reader)
+
+    def assertChangedBy(self, url, change):
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_streamed_asynchronously_under_asgi(self):
+        self.async_client.force_login(self.reader)
+        for url, types in [(reverse('api-feeds'), ['REVIEW', 'TICKET']), (reverse('api-posts'), ['REVIEW'])]:
+            self.assertFalse(self.client.get(url).is_async)
+            response = async_to_sync(self.async_client.get)(url)
+            self.assertTrue(response.is_async)
+
+            async def content():
+                return b''.join([chunk async for chunk in response.streaming_content])
+
+            items = json.loads(async_to_sync(content)())['items']
+            self.assertEqual([item['type'] for item in items], types)
+
+    def test_feed_validators(self):
+        url = reverse('api-feeds')
+
+        def edit_ticket():
+            self.ticket.title = 'Dune Messiah'
+            self.ticket.save()
+
+        def rename_author():
+            self.author.username = 'writer'
+            self.author.save()
+
+        self.assertChangedBy(url, edit_ticket)
+        self.assertChangedBy(url, lambda: Review.objects.create(
+            ticket=self.ticket, user=self.author, rating=5, headline='answer'
+        ))
+        self.assertChangedBy(url, rename_author)
+        self.assertChangedBy(url, lambda: UserFollows.objects.filter(user=self.reader).delete())
+
+        etag = self.client.get(url)['ETag']
+        Ticket.objects.create(title='other', user=User.objects.create_user('stranger'))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_posts_validators(self):
+        url = reverse('api-posts')
+
+        def rerate():
+            self.review.rating = 4
+            self.review.save()
+
+        self.assertChangedBy(url, rerate)
+        # the ticket of the review shows its counters
+        self.assertChangedBy(url, lambda: Review.objects.create(
+            ticket=self.ticket, user=self.author, rating=5, headline='answer'
+        ))
+
+        def soft_delete():
+            # the timelines are touched once the flag is committed
+            with self.captureOnCommitCallbacks(execute=True):
+                Review.objects.filter(pk=self.review.pk).soft_delete()
+
+        self.assertChangedBy(url, soft_delete)
+
+
+class ImportTests(EmptyCacheTestCase):
+
+    def test_import_again(self):
+        User.objects.create_user('reader')
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            for pk in (10, 11, 11):
+                file.write(json.dumps({'id': pk, 'user': 'reader', 'title': f'ticket {pk}'}) + '\n')
+            file.write(json.dumps({'id': 12, 'user': 'nobody', 'title': 'ticket 12'}) + '\n')
+            file.flush()
+            for expected in ('2 tickets imported, 1 already present, 1 skipped',
+                             '0 tickets imported, 3 already present, 1 skipped'):
+                output = StringIO()
+                call_command('import_data', 'tickets', file.name, stdout=output, stderr=StringIO())
+                self.assertIn(expected, output.getvalue().splitlines()[-1])
+        self.assertEqual(Ticket.objects.count(), 2)
+
+
+class AuthenticationTests(EmptyCacheTestCase):
+
+    def test_deactivation_applies_at_once(self):
+        user = User.objects.create_user('reader')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('feeds')).status_code, 200)
+        # an update sends no signal, like a change made by another worker process
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('feeds')).status_code, 302)
+
+    def test_cached_backend_refuses_a_local_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CachedModelBackend()
+        with self.assertRaises(ImproperlyConfigured):
+            SessionStore()
+
+    def test_logout_applies_at_once(self):
+        user = User.objects.create_user('reader')
+        self.client.force_login(user)
+        # deleted without a signal or a cache, like a logout handled by another worker process
+        Session.objects.filter(session_key=self.client.session.session_key).delete()
+        self.assertEqual(self.client.get(reverse('feeds')).status_code, 302)
+
+
+class ReplicaTests(EmptyCacheTestCase):
+
+    def read_only(self, value):
+        token = database.read_only.set(value)
+        self.addCleanup(database.read_only.reset, token)
+
+    def test_replica_mirrors_the_tests_database(self):
+        self.read_only(True)
+        self.assertFalse(database.replica_available())
+        self.assertIsNone(database.ReadReplicaRouter().db_for_read(Ticket))
+
+    @mock.patch('app.database.replica_available', return_value=True)
+    def test_routing(self, replica_available):
+        router = database.ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Ticket))
+        self.read_only(True)
+        self.assertEqual(router.db_for_read(Ticket), database.REPLICA)
+        # writes always go to the default database, even from a read-only view
+        self.assertEqual(router.db_for_write(Ticket), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate(database.REPLICA, 'app'))
+
+    def test_pragmas_of_a_read_only_connection(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'replica.sqlite3')
+        with closing(sqlite3.connect(path)) as writer:
+            writer.execute('CREATE TABLE item (id integer)')
+        replica = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': f'file:{path}?mode=ro', 'OPTIONS': {'uri': True},
+        }, alias='read-only')
+        self.addCleanup(replica.close)
+        # opening the connection applies the pragmas, the journal mode is left to the writer
+        replica.ensure_connection()
+        pragmas = {name: replica.connection.execute(f'PRAGMA {name}').fetchone()[0]
+                   for name in ('journal_mode', 'busy_timeout')}
+        self.assertEqual(pragmas, {'journal_mode': 'delete', 'busy_timeout': 5000})
+
+
+class AdminTests(EmptyCacheTestCase):
+
+    def test_delete_follows(self):
+        admin = User.objects.create_superuser('admin', password='password')
+        reader = User.objects.create_user('reader')
+        author = User.objects.create_user('author')
+        follow = UserFollows.objects.create(user=reader, followed_user=author)
+        Ticket.objects.create(title='ticket', user=author)
+        self.client.force_login(admin)
+        response = self.client.post(reverse('admin:app_userfollows_changelist'), {
+            'action': 'delete_follows', '_selected_action': [follow.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        reader.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual((reader.following_count, author.followers_count), (0, 0))
+        self.assertEqual(timeline_page(reader)[0], [])
+
+    def test_relations_are_fixed_on_change(self):
+        admin = User.objects.create_superuser('admin', password='password')
+        reader = User.objects.create_user('reader')
+        author = User.objects.create_user('author')
+        follow = UserFollows.objects.create(user=reader, followed_user=author)
+        tickets = [Ticket.objects.create(title=f'ticket {i}', user=author) for i in range(2)]
+        review = Review.objects.create(ticket=tickets[0], user=reader, rating=5, headline='review')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:app_userfollows_change', args=[follow.pk]), {
+            'user': reader.pk, 'followed_user': admin.pk,
+        })
+        self.client.post(reverse('admin:app_review_change', args=[review.pk]), {
+            'user': reader.pk, 'ticket': tickets[1].pk, 'rating': 4, 'headline': 'review', 'body': '',
+        })
+        follow.refresh_from_db()
+        review.refresh_from_db()
+        self.assertEqual((follow.followed_user, review.ticket, review.rating), (author, tickets[0], 4))
+        author.refresh_from_db()
+        tickets[0].refresh_from_db()
+        self.assertEqual((author.followers_count, tickets[0].review_count, tickets[0].rating_sum), (1, 1, 4))
+
+
+class RollupTests(EmptyCacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.users = [User.objects.create_user(f'reader{i}') for i in range(3)]
+        self.ticket = Ticket.objects.create(title='ticket', user=self.users[0])
+
+    def buckets(self):
+        return [
+            list(model.objects.filter(review_count__gt=0).order_by(f'{key}_id', 'week')
+                 .values_list(f'{key}_id', 'week', 'review_count', 'rating_sum', 'average',
+                              *[f'rating_{rating}' for rating in range(6)]))
+            for model, key in rollups.BUCKETS
+        ]
+
+    def assertRebuilt(self):
+        buckets = self.buckets()
+        rollups.rebuild_tickets()
+        rollups.rebuild_users()
+        self.assertEqual(buckets, self.buckets())
+
+    def review(self, user, rating):
+        return Review.objects.create(ticket=self.ticket, user=user, rating=rating, headline='review')
+
+    def test_changes(self):
+        first, second, third = (self.review(user, rating) for user, rating in zip(self.users, (3, 3, 5)))
+        self.assertEqual(self.buckets()[0][0][2:4], (3, 11))
+        first.rating = 1
+        first.save()
+        second.delete()
+        Review.objects.filter(pk=third.pk).soft_delete()
+        self.assertEqual(self.buckets()[0][0][2:4], (1, 1))
+        self.assertRebuilt()
+
+    def test_reviews_posted_before_the_buckets(self):
+        first, second, third = (self.review(user, 3) for user in self.users)
+        TicketRatingWeek.objects.all().delete()
+        ReviewerRatingWeek.objects.all().delete()
+        # the new rating creates a bucket counting only this review
+        first.rating = 4
+        first.save()
+        second.delete()
+        Review.objects.filter(pk=third.pk).soft_delete()
+        self.assertEqual(self.buckets()[0][0][2:4], (1, 4))
+        self.assertRebuilt()
+
+    def test_leaderboard_weeks(self):
+        self.client.force_login(self.users[0])
+        response = self.client.get(reverse('leaderboard'), {'week': '0001-01-01'})
+        self.assertEqual(response.context['week'], date(1, 1, 8))
+        self.assertEqual(response.context['previous_week'], date.min)
+        response = self.client.get(reverse('leaderboard'), {'week': '9999-12-31'})
+        self.assertEqual(response.context['week'], rollups.week_of(timezone.now()))
+        self.assertIsNone(response.context['next_week'])
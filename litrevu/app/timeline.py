@@ -0,0 +1,138 @@
+from itertools import islice
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Ticket, Review, User, UserFollows, TimelineEntry
+from .backends import forget_users
+
+BATCH_SIZE = 1000
+
+
+def follower_ids(user_id):
+    # read from the table, a follow made by another process a moment ago is already there
+    return set(UserFollows.objects.filter(followed_user_id=user_id).values_list('user_id', flat=True))
+
+
+def ticket_recipients(ticket):
+    return {ticket.user_id} | follower_ids(ticket.user_id)
+
+
+def review_recipients(review):
+    # the author of the ticket sees every review of it, even from users they don't follow
+    return {review.user_id, review.ticket.user_id} | follower_ids(review.user_id)
+
+
+def fan_out_ticket(ticket):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, ticket=ticket, time_created=ticket.time_created)
+         for user_id in ticket_recipients(ticket)],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+
+
+def fan_out_review(review):
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, review=review, time_created=review.time_created)
+         for user_id in review_recipients(review)],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+
+
+def touch(user_ids):
+    """Move the feed version of these users, the validator of their feed and posts API responses."""
+    user_ids = sorted(set(user_ids))
+    now = timezone.now()
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        User.objects.filter(pk__in=user_ids[start:start + BATCH_SIZE])\
+            .update(feed_version=F('feed_version') + 1, feed_updated=now)
+    forget_users(user_ids)
+
+
+def touch_items(ticket_ids=(), review_ids=()):
+    """
+    Touch the users whose timeline shows one of these tickets or reviews, or a review of one of these tickets,
+    after an item is posted or edited and before the entries of a deleted one go. The posts of a user are
+    always in their own timeline.
+    """
+    entries = TimelineEntry.objects.filter(
+        Q(ticket_id__in=ticket_ids) | Q(review_id__in=review_ids)
+        | Q(review_id__in=Review.all_objects.filter(ticket_id__in=ticket_ids).values('id'))
+    )
+    touch(entries.values_list('user_id', flat=True).distinct())
+
+
+def touch_authors(user_ids):
+    """Touch the users whose timeline shows a post of these users or a review of one of their tickets."""
+    entries = TimelineEntry.objects.filter(
+        Q(ticket_id__in=Ticket.all_objects.filter(user_id__in=user_ids).values('id'))
+        | Q(review_id__in=Review.all_objects.filter(Q(user_id__in=user_ids) | Q(ticket__user_id__in=user_ids))
+            .values('id'))
+    )
+    touch(entries.values_list('user_id', flat=True).distinct())
+
+
+def remove_tickets(ticket_ids):
+    """Touch the users showing these soft-deleted tickets and drop their entries."""
+    touch_items(ticket_ids=ticket_ids)
+    TimelineEntry.objects.filter(ticket_id__in=ticket_ids).delete()
+
+
+def remove_reviews(review_ids, ticket_ids):
+    """Drop the entries of soft-deleted reviews, every card of their tickets shows the counters they left."""
+    touch_items(ticket_ids=ticket_ids)
+    TimelineEntry.objects.filter(review_id__in=review_ids).delete()
+
+
+def backfill(user_id, followed_user_ids):
+    """Copy the existing tickets and reviews of newly followed users into the follower's timeline."""
+    entries = chain_entries(
+        user_id,
+        Ticket.objects.filter(user_id__in=followed_user_ids),
+        Review.objects.filter(user_id__in=followed_user_ids),
+    )
+    insert(entries)
+    touch([user_id])
+
+
+def prune(user_id, followed_user_id):
+    """Remove the items of an unfollowed user, except their reviews of the follower's own tickets."""
+    TimelineEntry.objects.filter(user_id=user_id)\
+        .filter(Q(ticket__user_id=followed_user_id) | Q(review__user_id=followed_user_id))\
+        .exclude(review__ticket__user_id=user_id)\
+        .delete()
+    touch([user_id])
+
+
+def insert(entries):
+    # bulk_create would materialize the whole generator, feed it one batch at a time instead
+    entries = iter(entries)
+    written = 0
+    while batch := list(islice(entries, BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        written += len(batch)
+    return written
+
+
+def chain_entries(user_id, tickets, reviews):
+    for ticket_id, time_created in tickets.values_list('id', 'time_created').iterator(chunk_size=BATCH_SIZE):
+        yield TimelineEntry(user_id=user_id, ticket_id=ticket_id, time_created=time_created)
+    for review_id, time_created in reviews.values_list('id', 'time_created').iterator(chunk_size=BATCH_SIZE):
+        yield TimelineEntry(user_id=user_id, review_id=review_id, time_created=time_created)
+
+
+def rebuild(user_ids):
+    """Recompute the timelines of the given users from scratch, returns the number of entries written."""
+    written = 0
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id__in=user_ids).delete()
+        for user_id in user_ids:
+            followed_users = UserFollows.objects.filter(user_id=user_id).values('followed_user')
+            written += insert(chain_entries(
+                user_id,
+                Ticket.objects.filter(Q(user_id__in=followed_users) | Q(user_id=user_id)),
+                Review.objects.filter(
+                    Q(user_id__in=followed_users) | Q(user_id=user_id) | Q(ticket__user_id=user_id)
+                ),
+            ))
+        touch(user_ids)
+    return written
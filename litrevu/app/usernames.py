@@ -0,0 +1,67 @@
+import threading
+from bisect import bisect_left, insort
+from functools import lru_cache
+from time import monotonic
+
+from .models import User
+
+SUGGESTIONS = 10
+CACHE_SIZE = 4096
+# signups in other processes are only seen after a full reload
+RELOAD_AFTER = 300
+
+
+class UsernameIndex:
+    """
+    Sorted in-memory list of the active usernames answering prefix lookups with a binary search.
+
+    Lookups are case insensitive and their results are kept in an LRU cache. A signup in this process
+    is inserted right away, the whole list is reloaded from the database every RELOAD_AFTER seconds.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, reload_after=RELOAD_AFTER):
+        self.lock = threading.Lock()
+        self.reload_after = reload_after
+        self.entries = None
+        self.loaded_at = None
+        self.cached_lookup = lru_cache(maxsize=cache_size)(self.lookup)
+
+    def load(self):
+        entries = sorted(
+            (username.casefold(), username)
+            for username in User.objects.filter(is_active=True).values_list('username', flat=True).iterator()
+        )
+        with self.lock:
+            self.entries = entries
+            self.loaded_at = monotonic()
+            self.cached_lookup.cache_clear()
+
+    def ensure_loaded(self):
+        if self.entries is None or monotonic() - self.loaded_at > self.reload_after:
+            self.load()
+
+    def add(self, username):
+        if self.entries is None:
+            # loaded on first use, it will include this user
+            return
+        with self.lock:
+            insort(self.entries, (username.casefold(), username))
+            self.cached_lookup.cache_clear()
+
+    def lookup(self, prefix, limit=SUGGESTIONS):
+        prefix = prefix.casefold()
+        with self.lock:
+            start = bisect_left(self.entries, (prefix,))
+            matches = []
+            for key, username in self.entries[start:start + limit]:
+                if not key.startswith(prefix):
+                    break
+                matches.append(username)
+        return tuple(matches)
+
+    def suggest(self, prefix, limit=SUGGESTIONS):
+        self.ensure_loaded()
+        return self.cached_lookup(prefix, limit)
+
+
+username_index = UsernameIndex()
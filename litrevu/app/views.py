@@ -1,14 +1,49 @@
+import json
+from datetime import date, timedelta
+from functools import partial
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.views import LoginView, LogoutView
 from django.contrib.auth import authenticate, login
-from django.views.generic import ListView, UpdateView, DeleteView, FormView, CreateView, TemplateView
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Value, CharField, Q
-from .models import Ticket, User, Review, UserFollows
+from django.views.generic import View, ListView, UpdateView, DeleteView, FormView, CreateView, TemplateView
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import JsonResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from .models import Ticket, User, Review, UserFollows, FollowSuggestion
 from .forms import TicketCreationForm, ReviewCreationForm, TicketAndReviewForm, FollowUserForm
-from itertools import chain
+from .feeds import keyset_page, merged_page, merged_keys, load_reviews, load_tickets, ordered_items, timeline_page, parse_cursor
+from .middleware import route_stats, cache_stats
+from .images import delete_renditions
+from .search import search
+from .rollups import week_of, top_tickets, top_reviewers, reviewer_totals
+from .usernames import username_index
+from .follow_graph import follow_many, unfollow_many
+from .concurrency import run_concurrently
+from .live import feed_hub, HubFull, RESET
+from .api import page_size, page_response, feed_etag, feed_last_modified, posts_etag, posts_last_modified
+
+
+class ReadReplicaMixin:
+    # reads go to the read-only replica, see app.database
+    read_only_database = True
+
+
+class SoftDeleteMixin:
+    """Flags the object as deleted instead of deleting it, the purge_deleted command removes it later."""
+
+    def form_valid(self, form):
+        success_url = self.get_success_url()
+        type(self.object).objects.filter(pk=self.object.pk).soft_delete()
+        return HttpResponseRedirect(success_url)
 
 
 class CustomLogoutView(LogoutView):
@@ -51,17 +86,38 @@ class TicketCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class TicketListView(LoginRequiredMixin, ListView):
+class TicketListView(ReadReplicaMixin, LoginRequiredMixin, ListView):
     model = Ticket
     template_name = 'ticket-list.html'
     context_object_name = 'tickets'
 
+    def get_queryset(self):
+        tickets = super().get_queryset().filter(user=self.request.user).select_related('user')
+        if 'unreviewed' in self.request.GET:
+            tickets = tickets.filter(review_count=0)
+        return tickets
+
+    def get_context_data(self, **kwargs):
+        tickets, next_cursor = keyset_page(self.object_list, cursor=parse_cursor(self.request.GET.get('before')))
+        return super().get_context_data(
+            object_list=tickets, next_cursor=next_cursor, unreviewed='unreviewed' in self.request.GET, **kwargs
+        )
+
 
 class TicketUpdateView(LoginRequiredMixin, UpdateView):
     model = Ticket
     fields = ['title', 'description', 'image']
     template_name = 'ticket-update.html'
 
+    def form_valid(self, form):
+        previous_image = form.initial.get('image')
+        response = super().form_valid(form)
+        # identical uploads share one stored file, another ticket may still show the previous image
+        if 'image' in form.changed_data and previous_image \
+                and not Ticket.all_objects.filter(image=previous_image.name).exists():
+            delete_renditions(previous_image.name)
+        return response
+
     def get_success_url(self):
         return reverse('ticket-list')
 
@@ -91,11 +147,18 @@ class ReviewCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class ReviewListView(LoginRequiredMixin, ListView):
+class ReviewListView(ReadReplicaMixin, LoginRequiredMixin, ListView):
     model = Review
     template_name = 'review-list.html'
     context_object_name = 'reviews'
 
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user).select_related('user')
+
+    def get_context_data(self, **kwargs):
+        reviews, next_cursor = keyset_page(self.object_list, cursor=parse_cursor(self.request.GET.get('before')))
+        return super().get_context_data(object_list=reviews, next_cursor=next_cursor, **kwargs)
+
 
 class ReviewUpdateView(LoginRequiredMixin, UpdateView):
     model = Review
@@ -106,7 +169,7 @@ class ReviewUpdateView(LoginRequiredMixin, UpdateView):
         return reverse('review-list')
 
 
-class ReviewDeleteView(LoginRequiredMixin, DeleteView):
+class ReviewDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = Review
     template_name = 'review-delete.html'
     success_url = reverse_lazy('posts')
@@ -123,7 +186,7 @@ class TicketAndReviewCreateView(LoginRequiredMixin, CreateView):
         return super().form_valid(form)
 
 
-class TicketDeleteView(LoginRequiredMixin, DeleteView):
+class TicketDeleteView(LoginRequiredMixin, SoftDeleteMixin, DeleteView):
     model = Ticket
     template_name = 'ticket-delete.html'
     success_url = reverse_lazy('posts')
@@ -135,13 +198,15 @@ class FollowView(LoginRequiredMixin, FormView):
     success_url = reverse_lazy('user-follow')
     model = UserFollows
     context_object_name = 'follow_data'
+    SUGGESTIONS_SHOWN = 5
 
     def form_valid(self, form):
-        follow_username = form.cleaned_data['follow_username']
-        user_to_follow = User.objects.get(username=follow_username)
-        if user_to_follow:
-            UserFollows.objects.create(user=self.request.user, followed_user=user_to_follow)
-            return super().form_valid(form)
+        try:
+            UserFollows.objects.create(user=self.request.user, followed_user=form.followed_user)
+        except IntegrityError:
+            # a concurrent submission followed the user since the form was validated
+            pass
+        return super().form_valid(form)
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -150,10 +215,15 @@ class FollowView(LoginRequiredMixin, FormView):
 
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
-        followed_users = UserFollows.objects.filter(user=self.request.user)
-        users_following = UserFollows.objects.filter(followed_user=self.request.user)
+        followed_users = UserFollows.objects.filter(user=self.request.user).select_related('followed_user')
+        users_following = UserFollows.objects.filter(followed_user=self.request.user).select_related('user')
+        # computed offline by suggest_follows, the users followed or deactivated since are skipped
+        suggestions = FollowSuggestion.objects.filter(user=self.request.user, suggested_user__is_active=True)\
+            .exclude(suggested_user__in=UserFollows.objects.filter(user=self.request.user).values('followed_user'))\
+            .select_related('suggested_user').order_by('rank')[:self.SUGGESTIONS_SHOWN]
         context['followed_users'] = followed_users
         context['users_following'] = users_following
+        context['suggestions'] = suggestions
 
         return context
 
@@ -164,54 +234,239 @@ class UnfollowView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy('user-follow')
 
 
-class PostView(LoginRequiredMixin, TemplateView):
+class BulkFollowView(LoginRequiredMixin, View):
+    """Follow or unfollow every posted `username` at once, `unfollow=1` switches to unfollowing."""
+
+    def post(self, request, *args, **kwargs):
+        usernames = set(request.POST.getlist('username'))
+        users = dict(User.objects.filter(username__in=usernames).values_list('pk', 'username'))
+        if request.POST.get('unfollow'):
+            changed = unfollow_many(request.user, users)
+        else:
+            changed = follow_many(request.user, users)
+        return JsonResponse({
+            'unfollowed' if request.POST.get('unfollow') else 'followed': sorted(users[pk] for pk in changed),
+            'unknown': sorted(usernames - set(users.values())),
+        })
+
+
+class PostView(ReadReplicaMixin, LoginRequiredMixin, TemplateView):
     template_name = 'posts.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        reviews = Review.objects.filter(user=self.request.user)\
-            .annotate(content_type=Value('REVIEW', CharField()))
-        tickets = Ticket.objects.filter(user=self.request.user)\
-            .annotate(content_type=Value('TICKET', CharField()))
-
-        posts = sorted(
-            chain(reviews, tickets),
-            key=lambda post: post.time_created,
-            reverse=True
-        )
+        reviews = Review.objects.filter(user=self.request.user)
+        tickets = Ticket.objects.filter(user=self.request.user)
+
+        posts, next_cursor = merged_page(reviews, tickets, cursor=parse_cursor(self.request.GET.get('before')))
 
         context['posts'] = posts
+        context['next_cursor'] = next_cursor
 
         return context
 
 
-class FeedView(LoginRequiredMixin, TemplateView):
+class LiveFeedMixin:
+
+    def get_context_data(self, **kwargs):
+        # LiveFeedView only streams under ASGI, the page doesn't connect to it otherwise
+        return super().get_context_data(live=isinstance(self.request, ASGIRequest), **kwargs)
+
+
+class FeedView(ReadReplicaMixin, LoginRequiredMixin, LiveFeedMixin, TemplateView):
     template_name = 'feeds.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        followed_users = UserFollows.objects.filter(
-            user=self.request.user
-            ).values_list('followed_user', flat=True)
-
-        reviews = Review.objects.filter(
-            Q(user__in=followed_users) |
-            Q(user=self.request.user) |
-            Q(ticket__user=self.request.user)
-            ).annotate(content_type=Value('REVIEW', CharField()))
-
-        tickets = Ticket.objects.filter(
-            Q(user__in=followed_users) |
-            Q(user=self.request.user)
-            ).annotate(content_type=Value('TICKET', CharField()))
-
-        feeds = sorted(
-            chain(reviews, tickets),
-            key=lambda feed: feed.time_created,
-            reverse=True
-        )
+        feeds, next_cursor = timeline_page(self.request.user, cursor=parse_cursor(self.request.GET.get('before')))
 
         context['feeds'] = feeds
-        print(feeds)
+        context['next_cursor'] = next_cursor
 
         return context
+
+
+class AsyncLoginRequiredMixin(LoginRequiredMixin):
+    """LoginRequiredMixin for async views, the session and the user are loaded outside of the event loop."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return self.handle_no_permission()
+        return await super(LoginRequiredMixin, self).dispatch(request, *args, **kwargs)
+
+
+class AsyncFeedView(ReadReplicaMixin, AsyncLoginRequiredMixin, LiveFeedMixin, TemplateView):
+    template_name = 'feeds.html'
+
+    async def get(self, request, *args, **kwargs):
+        feeds, next_cursor = await sync_to_async(timeline_page)(
+            request.user, cursor=parse_cursor(request.GET.get('before'))
+        )
+        return self.render_to_response(self.get_context_data(feeds=feeds, next_cursor=next_cursor, **kwargs))
+
+
+class AsyncPostView(ReadReplicaMixin, AsyncLoginRequiredMixin, TemplateView):
+    template_name = 'posts.html'
+
+    async def get(self, request, *args, **kwargs):
+        keys, next_cursor = await sync_to_async(merged_keys)(
+            Review.objects.filter(user=request.user),
+            Ticket.objects.filter(user=request.user),
+            cursor=parse_cursor(request.GET.get('before')),
+        )
+        reviews, tickets = await run_concurrently(partial(load_reviews, keys), partial(load_tickets, keys))
+        posts = ordered_items(keys, reviews, tickets)
+        return self.render_to_response(self.get_context_data(posts=posts, next_cursor=next_cursor, **kwargs))
+
+
+class AsyncFollowView(AsyncLoginRequiredMixin, FollowView):
+    # FormView also answers PUT with a sync handler, a view can't mix sync and async handlers
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    async def get(self, request, *args, **kwargs):
+        return self.render_to_response(await self.aget_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        form = self.get_form()
+        if await sync_to_async(form.is_valid)():
+            try:
+                await UserFollows.objects.acreate(user=request.user, followed_user=form.followed_user)
+            except IntegrityError:
+                pass
+            return HttpResponseRedirect(self.get_success_url())
+        return self.render_to_response(await self.aget_context_data(form=form))
+
+    async def aget_context_data(self, **kwargs):
+        context = self.get_context_data(**kwargs)
+        context['followed_users'], context['users_following'], context['suggestions'] = await run_concurrently(
+            partial(list, context['followed_users']), partial(list, context['users_following']),
+            partial(list, context['suggestions']),
+        )
+        return context
+
+
+class LiveFeedView(AsyncLoginRequiredMixin, View):
+    """
+    Server-sent events pushing the new items of the feed of the user, only served under ASGI.
+
+    Django doesn't notice a client disconnecting in the middle of a stream, each stream ends after
+    STREAM_LIFETIME seconds so abandoned subscriptions are released, EventSource reconnects by itself.
+    """
+    KEEPALIVE = 15
+    STREAM_LIFETIME = 300
+
+    async def get(self, request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse('live feed needs the ASGI server', status=501, content_type='text/plain')
+        try:
+            subscription = feed_hub.subscribe(request.user.pk)
+        except HubFull:
+            return HttpResponse('too many live feeds connected', status=503, content_type='text/plain',
+                                headers={'Retry-After': str(self.KEEPALIVE)})
+        response = StreamingHttpResponse(self.stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, subscription):
+        deadline = monotonic() + self.STREAM_LIFETIME
+        try:
+            yield f'retry: {self.KEEPALIVE * 1000}\n\n'
+            while monotonic() < deadline:
+                event = await subscription.get(timeout=min(self.KEEPALIVE, deadline - monotonic()))
+                if event is None:
+                    yield ': keepalive\n\n'
+                elif event is RESET:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                else:
+                    yield f"event: item\nid: {event['id']}\ndata: {json.dumps({'html': event['html']})}\n\n"
+        finally:
+            feed_hub.unsubscribe(subscription)
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=feed_etag, last_modified_func=feed_last_modified), name='get')
+class FeedApiView(ReadReplicaMixin, LoginRequiredMixin, View):
+    """JSON version of FeedView, conditional requests are answered with a 304 before the page is loaded."""
+
+    def get(self, request, *args, **kwargs):
+        items, next_cursor = timeline_page(
+            request.user, cursor=parse_cursor(request.GET.get('before')), page_size=page_size(request)
+        )
+        return page_response(request, items, next_cursor)
+
+
+@method_decorator(cache_control(private=True, no_cache=True), name='dispatch')
+@method_decorator(condition(etag_func=posts_etag, last_modified_func=posts_last_modified), name='get')
+class PostApiView(ReadReplicaMixin, LoginRequiredMixin, View):
+    """JSON version of PostView."""
+
+    def get(self, request, *args, **kwargs):
+        items, next_cursor = merged_page(
+            Review.objects.filter(user=request.user),
+            Ticket.objects.filter(user=request.user),
+            cursor=parse_cursor(request.GET.get('before')),
+            page_size=page_size(request),
+        )
+        return page_response(request, items, next_cursor)
+
+
+class UsernameAutocompleteView(LoginRequiredMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        prefix = request.GET.get('q', '').strip()
+        usernames = username_index.suggest(prefix) if prefix else ()
+        return JsonResponse({'usernames': list(usernames)})
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    template_name = 'search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        page = self.request.GET.get('page', '1')
+        page = int(page) if page.isdigit() and int(page) > 0 else 1
+
+        results, has_next = search(query, page) if query else ([], False)
+
+        context['query'] = query
+        context['results'] = results
+        context['page'] = page
+        context['has_next'] = has_next
+
+        return context
+
+
+class LeaderboardView(LoginRequiredMixin, ReadReplicaMixin, TemplateView):
+    # read from the weekly rating rollups, never from the review table
+    template_name = 'leaderboard.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        current_week = week_of(timezone.now())
+        try:
+            day = date.fromisoformat(self.request.GET['week'])
+            # the week before the first one shown must still be a date
+            week = min(max(day - timedelta(days=day.weekday()), date.min + timedelta(weeks=1)), current_week)
+        except (KeyError, ValueError):
+            week = current_week
+
+        context['week'] = week
+        context['previous_week'] = week - timedelta(weeks=1)
+        context['next_week'] = week + timedelta(weeks=1) if week < current_week else None
+        context['top_tickets'] = top_tickets(week)
+        context['top_reviewers'] = top_reviewers(week)
+        context['review_count'], context['average'] = reviewer_totals(self.request.user.pk)
+
+        return context
+
+
+class PerformanceStatsView(LoginRequiredMixin, UserPassesTestMixin, View):
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'routes': route_stats.snapshot(), 'caches': cache_stats.snapshot()})
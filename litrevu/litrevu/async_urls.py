@@ -0,0 +1,21 @@
+"""
+URL configuration serving the feed, posts and follow pages with their async views.
+
+Every other route is the same as in litrevu.urls. Point ROOT_URLCONF (or the DJANGO_ROOT_URLCONF
+environment variable) at this module when the project runs under ASGI.
+"""
+from django.urls import path
+from app.views import AsyncFeedView, AsyncPostView, AsyncFollowView
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'feeds': AsyncFeedView,
+    'posts': AsyncPostView,
+    'user-follow': AsyncFollowView,
+}
+
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name].as_view(), name=pattern.name)
+    if getattr(pattern, 'name', None) in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
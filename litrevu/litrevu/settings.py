@@ -44,22 +44,35 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'app.User'
 
+# sessions are read from the database so that a logout applies to every worker at once. app.sessions
+# reads them from the cache instead, it needs a cache shared by every process like CachedModelBackend below
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
+# the user is loaded from the database on every request so that a password change, a deactivation or a
+# permission change applies to every worker at once. app.backends.CachedModelBackend serves it from the
+# cache instead, it needs a cache shared by every process and refuses the locmem one configured below
+AUTHENTICATION_BACKENDS = [
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = "/feeds/"
 
 LOGOUT_REDIRECT_URL = '/login/'
 
 MIDDLEWARE = [
+    'app.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.ReadReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'litrevu.urls'
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'litrevu.urls')
 
 TEMPLATES = [
     {
@@ -83,10 +96,52 @@ WSGI_APPLICATION = 'litrevu.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# connections are kept open between requests, the read-only replica alias opens the same file for the
+# views flagged with read_only_database, see app.database
+
+CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'db.sqlite3'}?mode=ro",
+        'OPTIONS': {'uri': True},
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['app.database.ReadReplicaRouter']
+
+# applied to every sqlite connection when it opens, WAL lets readers run while a write is in progress
+# https://www.sqlite.org/pragma.html
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# holds the rendered feed cards, use a shared backend (memcached, redis) when running several processes
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
 
@@ -133,6 +188,16 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# uploads are stored under the hash of their content, identical files are kept once
+STORAGES = {
+    'default': {
+        'BACKEND': 'app.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -15,12 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import path, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
 from app.views import CustomLogoutView, CustomSignUpView, TicketCreateView,\
     TicketListView, TicketUpdateView, ReviewCreateView, ReviewListView, ReviewUpdateView, TicketAndReviewCreateView, \
-    FollowView, PostView, UnfollowView, CustomLoginView, ReviewDeleteView, TicketDeleteView, FeedView
+    FollowView, PostView, UnfollowView, CustomLoginView, ReviewDeleteView, TicketDeleteView, FeedView, \
+    PerformanceStatsView, SearchView, UsernameAutocompleteView, BulkFollowView, \
+    LiveFeedView, FeedApiView, PostApiView, LeaderboardView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -38,12 +41,25 @@ urlpatterns = [
     path('review/<int:pk>/update/', ReviewUpdateView.as_view(), name='review-update'),
     path('review/<int:pk>/delete/', ReviewDeleteView.as_view(), name='review-delete'),
     path('follow/', FollowView.as_view(), name='user-follow'),
+    path('follow/bulk/', BulkFollowView.as_view(), name='user-follow-bulk'),
+    path('follow/autocomplete/', UsernameAutocompleteView.as_view(), name='username-autocomplete'),
     path('unfollow/<int:pk>', UnfollowView.as_view(), name='user-unfollow'),
     path('posts/', PostView.as_view(), name='posts'),
     path('feeds/', FeedView.as_view(), name='feeds'),
+    path('feeds/live/', LiveFeedView.as_view(), name='feed-live'),
+    path('api/feeds/', FeedApiView.as_view(), name='api-feeds'),
+    path('api/posts/', PostApiView.as_view(), name='api-posts'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('leaderboard/', LeaderboardView.as_view(), name='leaderboard'),
+    path('stats/performance/', PerformanceStatsView.as_view(), name='performance-stats'),
 
 
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # uploads are stored under the hash of their content and never change once written
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'),
+                cache_control(max_age=31536000, immutable=True)(serve),
+                {'document_root': settings.MEDIA_ROOT}),
+    ]